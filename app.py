@@ -1,11 +1,18 @@
 import os
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
-from sqlalchemy import create_engine, func, desc
-from sqlalchemy.orm import sessionmaker
+from datetime import datetime
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, flash
+from sqlalchemy.orm import sessionmaker, joinedload
 from werkzeug.middleware.proxy_fix import ProxyFix
-from models import Base, Personality, Quote, Command, Vote, Stats
-from config import DATABASE_URL, SECRET_KEY, HOST, PORT, PERSONALITIES
+from models import Personality, Quote
+from config import (DATABASE_URL, SECRET_KEY, HOST, PORT, PERSONALITIES, RESPONSE_CACHE_BACKEND,
+                    RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_DB_PATH, API_MAX_RANDOM_QUOTES,
+                    API_MAX_PAGE_SIZE, API_MAX_VOTE_BATCH)
 from quotes_manager import QuotesManager
+from database import get_engine, get_writer, pool_metrics
+from response_cache import create_response_cache, VOTES, COMMANDS, QUOTES
+import stats_service
+from pagination import keyset_page
+from data_export import EXPORTS, FORMATS, export_rows, gzip_chunks
 
 # Create Flask app
 app = Flask(__name__)
@@ -15,17 +22,26 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 # Configure database
 db_url = os.environ.get('DATABASE_URL', DATABASE_URL)
 app.config["SQLALCHEMY_DATABASE_URI"] = db_url
-engine = create_engine(db_url, connect_args={"sslmode": "require"})
-Base.metadata.create_all(engine)
+engine = get_engine(db_url)
 Session = sessionmaker(bind=engine)
 
-# Initialize quotes manager and load personalities and quotes
-quotes_manager = QuotesManager()
+# Initialize quotes manager on the same engine and load personalities and quotes
+quotes_manager = QuotesManager(engine)
 with app.app_context():
     # Make sure the database is properly set up with personalities and quotes
     quotes_manager.setup_database()
 
+# Rendered pages are reused until a vote, command or quote reload bumps their generation
+response_cache = create_response_cache(RESPONSE_CACHE_BACKEND, quotes_manager.generations,
+                                       RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_DB_PATH)
+
+@app.before_request
+def pick_up_changes():
+    """Reload the corpus after a /reload in the bot (checked at most every CHANGE_CHECK_INTERVAL)"""
+    quotes_manager.check_for_changes()
+
 @app.route('/')
+@response_cache.cached(VOTES, COMMANDS, QUOTES)
 def index():
     """Dashboard homepage"""
     session = Session()
@@ -33,12 +49,10 @@ def index():
     try:
         # Basic stats with error handling
         try:
-            total_quotes = session.query(func.count(Quote.id)).scalar() or 0
-            total_commands = session.query(func.count(Command.id)).scalar() or 0
-            total_votes = session.query(func.count(Vote.id)).scalar() or 0
+            totals = stats_service.totals(session)
         except Exception as e:
             app.logger.error(f"Error getting basic stats: {e}")
-            total_quotes = total_commands = total_votes = 0
+            totals = {'total_quotes': 0, 'total_commands': 0, 'total_votes': 0}
             
         try:
             personalities = session.query(Personality).all()
@@ -46,38 +60,25 @@ def index():
             app.logger.error(f"Error getting personalities: {e}")
             personalities = []
             
-        stats = {
-            'total_quotes': total_quotes,
-            'total_commands': total_commands,
-            'total_votes': total_votes,
-            'personalities': personalities
-        }
+        stats = dict(totals, personalities=personalities)
         
         # Get top 5 quotes with error handling
         try:
-            top_quotes = session.query(Quote).\
-                order_by((Quote.upvotes - Quote.downvotes).desc()).\
-                limit(5).all()
+            top_quotes = stats_service.top_quotes(session, 5)
         except Exception as e:
             app.logger.error(f"Error getting top quotes: {e}")
             top_quotes = []
         
         # Get recently used quotes with error handling
         try:
-            recent_quotes = session.query(Quote).\
-                filter(Quote.last_used != None).\
-                order_by(Quote.last_used.desc()).\
-                limit(5).all()
+            recent_quotes = stats_service.recent_quotes(session, 5)
         except Exception as e:
             app.logger.error(f"Error getting recent quotes: {e}")
             recent_quotes = []
         
         # Get most used commands with error handling
         try:
-            commands_stats = session.query(
-                Command.command,
-                func.count(Command.id).label('count')
-            ).group_by(Command.command).order_by(desc('count')).limit(5).all()
+            commands_stats = stats_service.command_counts(session, 5)
         except Exception as e:
             app.logger.error(f"Error getting command stats: {e}")
             commands_stats = []
@@ -94,6 +95,7 @@ def index():
         session.close()
 
 @app.route('/quotes')
+@response_cache.cached(VOTES, QUOTES)
 def quotes():
     """Quotes management page"""
     session = Session()
@@ -104,26 +106,34 @@ def quotes():
         page = int(request.args.get('page', 1))
         per_page = 20
         
-        # Base query
-        query = session.query(Quote)
-        
-        # Apply filters
-        if personality_name:
-            personality = session.query(Personality).filter_by(file_name=personality_name).first()
+        if search_query:
+            # Ranked full-text search; only the ids for this page go to the database
+            search_personality = personality_name if quotes_manager.corpus.personality(personality_name) else None
+            total_count, quote_ids = quotes_manager.search_quote_ids(
+                search_query, search_personality, (page - 1) * per_page, per_page)
+            rows = {quote.id: quote for quote in session.query(Quote).options(joinedload(Quote.personality)).
+                    filter(Quote.id.in_(quote_ids))}
+            quotes = [rows[quote_id] for quote_id in quote_ids if quote_id in rows]
+            previous_cursor = next_cursor = None
+        else:
+            # Keyset pagination on (personality_id, number); the total comes from the corpus
+            query = session.query(Quote).options(joinedload(Quote.personality))
+            
+            # Apply filters
+            personality = quotes_manager.corpus.personality(personality_name) if personality_name else None
             if personality:
                 query = query.filter(Quote.personality_id == personality.id)
+            total_count = quotes_manager.corpus.count(personality.file_name if personality else None)
+            
+            try:
+                quotes, previous_cursor, next_cursor = keyset_page(
+                    query, (Quote.personality_id, Quote.number), per_page,
+                    after=request.args.get('after'), before=request.args.get('before'))
+            except ValueError:
+                return redirect(url_for('quotes', personality=personality_name))
         
-        if search_query:
-            query = query.filter(Quote.content.like(f"%{search_query}%"))
-        
-        # Get total count for pagination
-        total_count = query.count()
         total_pages = (total_count + per_page - 1) // per_page
         
-        # Apply pagination
-        quotes = query.order_by(Quote.personality_id, Quote.number).\
-            offset((page - 1) * per_page).limit(per_page).all()
-        
         # Get all personalities for filter dropdown
         personalities = session.query(Personality).all()
         
@@ -133,7 +143,10 @@ def quotes():
                                current_personality=personality_name,
                                current_search=search_query,
                                current_page=page,
-                               total_pages=total_pages)
+                               total_pages=total_pages,
+                               total_count=total_count,
+                               previous_cursor=previous_cursor,
+                               next_cursor=next_cursor)
     except Exception as e:
         app.logger.error(f"Error loading quotes page: {e}")
         return render_template('quotes.html', error=str(e))
@@ -141,6 +154,7 @@ def quotes():
         session.close()
 
 @app.route('/stats')
+@response_cache.cached(VOTES, COMMANDS, QUOTES)
 def stats():
     """Statistics page"""
     session = Session()
@@ -148,80 +162,33 @@ def stats():
     try:
         # General stats with safe defaults
         try:
-            total_quotes = session.query(func.count(Quote.id)).scalar() or 0
-            total_commands = session.query(func.count(Command.id)).scalar() or 0
-            total_votes = session.query(func.count(Vote.id)).scalar() or 0
+            general_stats = stats_service.totals(session)
         except Exception as e:
             app.logger.error(f"Error getting general stats: {e}")
-            total_quotes = total_commands = total_votes = 0
-            
-        general_stats = {
-            'total_quotes': total_quotes,
-            'total_commands': total_commands,
-            'total_votes': total_votes,
-        }
+            general_stats = {'total_quotes': 0, 'total_commands': 0, 'total_votes': 0}
         
         # Personality stats
-        personality_stats = []
         try:
-            personalities = session.query(Personality).all()
-            for personality in personalities:
-                try:
-                    quote_count = session.query(func.count(Quote.id)).\
-                        filter(Quote.personality_id == personality.id).scalar() or 0
-                    
-                    used_count = session.query(func.sum(Quote.use_count)).\
-                        filter(Quote.personality_id == personality.id).scalar() or 0
-                    
-                    most_popular = session.query(Quote).\
-                        filter(Quote.personality_id == personality.id).\
-                        order_by((Quote.upvotes - Quote.downvotes).desc()).\
-                        first()
-                    
-                    personality_stats.append({
-                        'personality': personality,
-                        'quote_count': quote_count,
-                        'used_count': used_count,
-                        'most_popular': most_popular
-                    })
-                except Exception as e:
-                    app.logger.error(f"Error processing personality {personality.name}: {e}")
-                    personality_stats.append({
-                        'personality': personality,
-                        'quote_count': 0,
-                        'used_count': 0,
-                        'most_popular': None
-                    })
+            personality_stats = stats_service.personality_stats(session)
         except Exception as e:
             app.logger.error(f"Error getting personalities: {e}")
+            personality_stats = []
             
-        # Command usage over time (last 7 days) with safe defaults
-        command_usage = []
+        # Command usage over time (last 7 days by default) read from the hourly rollup
+        days = min(max(request.args.get('days', 7, type=int), 1), 365)
+        granularity = 'hour' if request.args.get('granularity') == 'hour' else 'day'
         try:
-            # Create a simple 7-day mock data for the chart
-            for i in range(7):
-                day_offset = 6 - i  # Reverse order: 6, 5, 4, 3, 2, 1, 0
-                from datetime import datetime, timedelta
-                date = datetime.utcnow() - timedelta(days=day_offset)
-                date_str = date.strftime("%Y-%m-%d")
-                
-                # Try to get actual data if available, otherwise use 0
-                try:
-                    count = session.query(func.count(Command.id)).\
-                        filter(func.date(Command.timestamp) == func.date(date)).scalar() or 0
-                except Exception:
-                    count = 0
-                
-                command_usage.append({'date': date_str, 'count': count})
+            command_usage = stats_service.daily_command_usage(session, days, granularity)
         except Exception as e:
             app.logger.error(f"Error processing command usage: {e}")
             # Provide default data for the chart if all else fails
-            command_usage = [{'date': f"Day-{i}", 'count': 0} for i in range(7)]
+            command_usage = [{'date': f"Day-{i}", 'count': 0} for i in range(days)]
         
         return render_template('stats.html',
                                general_stats=general_stats,
                                personality_stats=personality_stats,
-                               command_usage=command_usage)
+                               command_usage=command_usage,
+                               days=days)
     except Exception as e:
         app.logger.error(f"Error loading stats page: {e}")
         return render_template('stats.html', error=str(e))
@@ -229,6 +196,18 @@ def stats():
         session.close()
 
 # API Endpoints
+def quote_json(quote):
+    """Public JSON representation of a quote"""
+    return {
+        'id': quote.id,
+        'personality': quote.personality.name,
+        'number': quote.number,
+        'content': quote.content,
+        'upvotes': quote.upvotes,
+        'downvotes': quote.downvotes,
+        'score': quote.upvotes - quote.downvotes
+    }
+
 @app.route('/api/quotes/random', methods=['GET'])
 def api_random_quote():
     """API endpoint for random quote"""
@@ -236,30 +215,59 @@ def api_random_quote():
     
     try:
         personality_name = request.args.get('personality')
+        count = request.args.get('count', type=int)
         
         if personality_name and personality_name in PERSONALITIES:
-            # Get random quote from specific personality
-            personality = session.query(Personality).filter_by(file_name=personality_name).first()
-            if not personality:
+            if not quotes_manager.corpus.personality(personality_name):
                 return jsonify({'error': 'Personality not found'}), 404
-            
-            quote = session.query(Quote).filter_by(personality_id=personality.id).\
-                order_by(func.random()).first()
         else:
-            # Get random quote from any personality
-            quote = session.query(Quote).order_by(func.random()).first()
+            personality_name = None
+        
+        # Ids are sampled from the in-memory corpus; only the chosen rows are read, by primary key
+        sampled = quotes_manager.get_random_quotes(min(max(count or 1, 1), API_MAX_RANDOM_QUOTES), personality_name)
+        rows = {quote.id: quote for quote in session.query(Quote).options(joinedload(Quote.personality)).
+                filter(Quote.id.in_([quote.id for quote in sampled]))}
+        quotes = [quote_json(rows[quote.id]) for quote in sampled if quote.id in rows]
         
-        if not quote:
+        if count is not None:
+            return jsonify({'quotes': quotes})
+        if not quotes:
             return jsonify({'error': 'No quotes found'}), 404
+        return jsonify(quotes[0])
+    except Exception as e:
+        app.logger.error(f"API error: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
+
+@app.route('/api/quotes', methods=['GET'])
+def api_quotes():
+    """API endpoint listing quotes in (personality, number) order with cursor pagination"""
+    session = Session()
+    
+    try:
+        personality_name = request.args.get('personality')
+        limit = min(max(request.args.get('limit', 100, type=int), 1), API_MAX_PAGE_SIZE)
+        
+        query = session.query(Quote).options(joinedload(Quote.personality))
+        if personality_name:
+            personality = quotes_manager.corpus.personality(personality_name)
+            if not personality:
+                return jsonify({'error': 'Personality not found'}), 404
+            query = query.filter(Quote.personality_id == personality.id)
+        
+        try:
+            quotes, previous_cursor, next_cursor = keyset_page(
+                query, (Quote.personality_id, Quote.number), limit,
+                after=request.args.get('after'), before=request.args.get('before'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
-            'id': quote.id,
-            'personality': quote.personality.name,
-            'number': quote.number,
-            'content': quote.content,
-            'upvotes': quote.upvotes,
-            'downvotes': quote.downvotes,
-            'score': quote.upvotes - quote.downvotes
+            'quotes': [quote_json(quote) for quote in quotes],
+            'total': quotes_manager.corpus.count(personality_name),
+            'previous_cursor': previous_cursor,
+            'next_cursor': next_cursor
         })
     except Exception as e:
         app.logger.error(f"API error: {e}")
@@ -270,8 +278,6 @@ def api_random_quote():
 @app.route('/api/quotes/<int:quote_id>/vote', methods=['POST'])
 def api_vote_quote(quote_id):
     """API endpoint for voting on a quote"""
-    session = Session()
-    
     try:
         data = request.get_json()
         if not data or 'vote' not in data or 'user_id' not in data:
@@ -283,51 +289,15 @@ def api_vote_quote(quote_id):
         if vote_value not in [1, -1]:
             return jsonify({'error': 'Vote must be 1 (upvote) or -1 (downvote)'}), 400
         
-        # Get quote
-        quote = session.query(Quote).get(quote_id)
-        if not quote:
+        # Same path as the bot and the batch endpoint, so quote and stats counters stay in step
+        statuses = quotes_manager.record_votes([(str(user_id), quote_id, vote_value)])
+        if statuses is None:
+            return jsonify({'error': 'Could not record vote'}), 500
+        if statuses[0] == 'unknown_quote':
             return jsonify({'error': 'Quote not found'}), 404
         
-        # Check if user already voted for this quote
-        existing_vote = session.query(Vote).filter_by(
-            user_id=user_id,
-            quote_id=quote_id
-        ).first()
-        
-        if existing_vote:
-            # Update existing vote
-            if existing_vote.vote != vote_value:
-                old_vote = existing_vote.vote
-                existing_vote.vote = vote_value
-                
-                # Remove the old vote
-                if old_vote == 1:
-                    quote.upvotes -= 1
-                else:
-                    quote.downvotes -= 1
-                
-                # Add the new vote
-                if vote_value == 1:
-                    quote.upvotes += 1
-                else:
-                    quote.downvotes += 1
-        else:
-            # Create new vote
-            new_vote = Vote(
-                user_id=user_id,
-                quote_id=quote_id,
-                vote=vote_value
-            )
-            session.add(new_vote)
-            
-            # Update quote
-            if vote_value == 1:
-                quote.upvotes += 1
-            else:
-                quote.downvotes += 1
-        
-        session.commit()
-        
+        # Counters come from the corpus, which includes deltas the write-behind buffer has not flushed yet
+        quote = quotes_manager.get_quote(quote_id)
         return jsonify({
             'success': True,
             'quote_id': quote_id,
@@ -336,24 +306,49 @@ def api_vote_quote(quote_id):
             'score': quote.upvotes - quote.downvotes
         })
     except Exception as e:
-        session.rollback()
         app.logger.error(f"API error: {e}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        session.close()
+
+@app.route('/api/votes/batch', methods=['POST'])
+def api_vote_batch():
+    """API endpoint applying many {user_id, quote_id, vote} records in one transaction"""
+    data = request.get_json(silent=True)
+    records = data.get('votes') if isinstance(data, dict) else data
+    if not isinstance(records, list):
+        return jsonify({'error': 'Expected a JSON list of votes or {"votes": [...]}'}), 400
+    if len(records) > API_MAX_VOTE_BATCH:
+        return jsonify({'error': f"At most {API_MAX_VOTE_BATCH} votes per batch"}), 413
+    
+    results = [None] * len(records)
+    valid, positions = [], []
+    for index, record in enumerate(records):
+        if (not isinstance(record, dict) or record.get('vote') not in (1, -1)
+                or not isinstance(record.get('quote_id'), int) or record.get('user_id') in (None, '')):
+            results[index] = {'index': index, 'status': 'invalid'}
+            continue
+        valid.append((str(record['user_id']), record['quote_id'], record['vote']))
+        positions.append(index)
+    
+    statuses = quotes_manager.record_votes(valid) if valid else []
+    if statuses is None:
+        return jsonify({'error': 'Could not record votes, nothing was applied'}), 500
+    for index, status in zip(positions, statuses):
+        results[index] = {'index': index, 'status': status}
+    
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return jsonify({'results': results, 'summary': summary})
 
 @app.route('/api/stats', methods=['GET'])
+@response_cache.cached(VOTES, COMMANDS, QUOTES)
 def api_stats():
     """API endpoint for statistics"""
     session = Session()
     
     try:
-        stats = {
-            'total_quotes': session.query(func.count(Quote.id)).scalar(),
-            'total_commands': session.query(func.count(Command.id)).scalar(),
-            'total_votes': session.query(func.count(Vote.id)).scalar(),
-            'personalities': []
-        }
+        stats = dict(stats_service.totals(session), personalities=[])
+        top_quotes = stats_service.top_quotes_by_personality(session, 3)
         
         for personality in session.query(Personality).all():
             p_stats = {
@@ -363,13 +358,7 @@ def api_stats():
                 'top_quotes': []
             }
             
-            # Get top 3 quotes for this personality
-            top_quotes = session.query(Quote).\
-                filter(Quote.personality_id == personality.id).\
-                order_by((Quote.upvotes - Quote.downvotes).desc()).\
-                limit(3).all()
-            
-            for quote in top_quotes:
+            for quote in top_quotes.get(personality.id, []):
                 p_stats['top_quotes'].append({
                     'id': quote.id,
                     'number': quote.number,
@@ -386,6 +375,43 @@ def api_stats():
     finally:
         session.close()
 
+@app.route('/api/export/<table_name>', methods=['GET'])
+def api_export(table_name):
+    """API endpoint streaming quotes, votes or commands as NDJSON or CSV, optionally since an id or time"""
+    if table_name not in EXPORTS:
+        return jsonify({'error': f"Unknown export '{table_name}'"}), 404
+    
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return jsonify({'error': 'Format must be ndjson or csv'}), 400
+    since_id = request.args.get('since_id', type=int)
+    try:
+        since = datetime.fromisoformat(request.args['since']) if 'since' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'since must be an ISO 8601 timestamp'}), 400
+    
+    def generate():
+        # The connection lives as long as the stream; rows arrive through a server-side cursor
+        with engine.connect() as connection:
+            yield from export_rows(connection, table_name, fmt, since_id, since)
+    
+    chunks = generate()
+    headers = {'Content-Disposition': f"attachment; filename={table_name}.{fmt}", 'Vary': 'Accept-Encoding'}
+    if 'gzip' in request.accept_encodings:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(chunks, mimetype=FORMATS[fmt], headers=headers)
+
+@app.route('/api/cache', methods=['GET'])
+def api_cache_metrics():
+    """API endpoint for response cache hit/miss counters of this worker"""
+    return jsonify(response_cache.metrics())
+
+@app.route('/api/db', methods=['GET'])
+def api_db_metrics():
+    """API endpoint for connection pool checkout and wait counters of this worker"""
+    return jsonify(dict(pool_metrics(engine), writer=get_writer(engine).metrics()))
+
 def run_app():
     """Run the Flask app"""
     app.run(host=HOST, port=PORT, debug=True)
@@ -0,0 +1,75 @@
+"""
+Zulte Kroniki Command Archiver
+Moves raw command log rows older than the retention period into a gzipped CSV
+file and deletes them; the hourly command_usage rollup keeps the chart counts.
+Links from sent Discord messages to quotes are dropped after the same period.
+Can also rebuild the rollup from the raw rows (compaction).
+
+Usage: python archive_commands.py [--days N] [--rebuild-rollup [--since YYYY-MM-DD]]
+"""
+import os
+import sys
+import argparse
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import delete
+from models import QuoteMessage
+from migrations import upgrade
+from database import get_engine, get_writer
+from command_rollup import archive_commands, rebuild, hour_bucket
+from config import COMMAND_RETENTION_DAYS, COMMAND_ARCHIVE_DIRECTORY
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old command rows and maintain the usage rollup")
+    parser.add_argument('--days', type=int, default=COMMAND_RETENTION_DAYS,
+                        help="keep this many days of raw commands (0 disables archiving)")
+    parser.add_argument('--directory', default=COMMAND_ARCHIVE_DIRECTORY)
+    parser.add_argument('--rebuild-rollup', action='store_true',
+                        help="recompute command_usage from the raw command rows")
+    parser.add_argument('--since', type=datetime.fromisoformat,
+                        help="with --rebuild-rollup, only recompute hours from this date")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    upgrade(engine)
+    writer = get_writer(engine)  # BEGIN IMMEDIATE on SQLite, so the bot's writes queue behind ours
+
+    def rebuild_rollup():
+        with engine.begin() as connection:
+            return rebuild(connection, args.since)
+
+    def archive(cutoff, path):
+        with engine.begin() as connection:
+            archived = archive_commands(connection, cutoff, path)
+            messages = QuoteMessage.__table__
+            pruned = connection.execute(delete(messages).where(messages.c.created_at < cutoff)).rowcount
+        return archived, pruned
+
+    try:
+        if args.rebuild_rollup:
+            read = writer.run(rebuild_rollup)
+            logging.info(f"Rebuilt command usage rollup from {read} command rows")
+
+        if args.days > 0:
+            # Whole hours only: rebuild() starts at the hour of the oldest remaining row, so archiving part
+            # of an hour would drop the archived rows' counts from that hour
+            cutoff = hour_bucket(datetime.utcnow() - timedelta(days=args.days))
+            os.makedirs(args.directory, exist_ok=True)
+            path = os.path.join(args.directory, f"commands-{cutoff:%Y%m%d%H%M%S}.csv.gz")
+            archived, pruned = writer.run(archive, cutoff, path)
+            logging.info(f"Dropped {pruned} quote message links older than {cutoff:%Y-%m-%d}")
+            if archived:
+                logging.info(f"Archived {archived} commands older than {cutoff:%Y-%m-%d} to {path}")
+            else:
+                os.remove(path)
+                logging.info(f"No commands older than {cutoff:%Y-%m-%d}")
+    except Exception as e:
+        logging.error(f"Archiving failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncQuotesManager:
+    """Awaitable facade over QuotesManager that keeps database work off the event loop
+
+    Calls that only touch the in-memory corpus or the write-behind buffer run inline;
+    everything that issues SQL is handed to a bounded thread pool.
+    """
+
+    def __init__(self, quotes_manager, max_workers):
+        self.manager = quotes_manager
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="quotes-db")
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    # In-memory operations
+    async def get_random_quote(self, personality_file_name=None, channel_id=None):
+        return self.manager.get_random_quote(personality_file_name, channel_id)
+
+    async def get_specific_quote(self, personality_file_name, number):
+        return self.manager.get_specific_quote(personality_file_name, number)
+
+    async def record_command(self, user_id, command, quote_id=None):
+        self.manager.record_command(user_id, command, quote_id)
+
+    async def remember_message(self, message_id, quote_id):
+        self.manager.remember_message(message_id, quote_id)
+
+    # Cooldowns: inline for the in-memory backend, on the pool when the store is a shared SQLite file
+    async def _run_cooldown(self, func, *args):
+        if self.manager.cooldowns.blocking:
+            return await self._run(func, *args)
+        return func(*args)
+
+    async def check_cooldown(self, user_id, command):
+        return await self._run_cooldown(self.manager.check_cooldown, user_id, command)
+
+    async def check_specific_quote_cooldown(self, user_id, personality_number):
+        return await self._run_cooldown(self.manager.check_specific_quote_cooldown, user_id, personality_number)
+
+    async def cooldown_metrics(self):
+        return await self._run_cooldown(self.manager.cooldowns.metrics)
+
+    # Database operations
+    async def get_quote(self, quote_id):
+        return await self._run(self.manager.get_quote, quote_id)
+
+    async def quote_for_message(self, message_id, title=None):
+        # Recent messages resolve from memory; only older ones need the database
+        quote = self.manager.cached_quote_for_message(message_id)
+        if quote:
+            return quote
+        return await self._run(self.manager.quote_for_message, message_id, title)
+
+    async def record_vote(self, user_id, quote_id, vote_value):
+        return await self._run(self.manager.record_vote, user_id, quote_id, vote_value)
+
+    async def get_top_quotes(self, limit=10):
+        return await self._run(self.manager.get_top_quotes, limit)
+
+    async def search_quotes(self, query, personality_file_name=None):
+        return await self._run(self.manager.search_quotes, query, personality_file_name)
+
+    async def search_quotes_page(self, query, personality_file_name=None, offset=0, limit=None):
+        return await self._run(self.manager.search_quotes_page, query, personality_file_name, offset, limit)
+
+    async def get_statistics(self):
+        return await self._run(self.manager.get_statistics)
+
+    async def reload_quotes(self):
+        return await self._run(self.manager.reload_quotes)
+
+    async def check_for_changes(self):
+        return await self._run(self.manager.check_for_changes)
+
+    def close(self):
+        """Wait for in-flight database calls, then flush the underlying manager"""
+        self.executor.shutdown(wait=True)
+        self.manager.close()
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up from a fixed-interval sleep
+
+    Any lag above a few milliseconds means some callback blocked the loop.
+    """
+
+    def __init__(self, interval, warn_threshold):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.samples = 0
+        self.total_lag = 0.0
+        self._task = None
+
+    @property
+    def average_lag(self):
+        return self.total_lag / self.samples if self.samples else 0.0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self):
+        """Return lag metrics in milliseconds"""
+        return {
+            'last_ms': self.last_lag * 1000,
+            'max_ms': self.max_lag * 1000,
+            'avg_ms': self.average_lag * 1000,
+            'samples': self.samples
+        }
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+            self.samples += 1
+            if lag > self.warn_threshold:
+                logger.warning(f"Event loop blocked for {lag * 1000:.1f} ms")
+
+
+class ChangeMonitor:
+    """Periodically picks up quote reloads and vote imports committed by other processes"""
+
+    def __init__(self, async_quotes, interval):
+        self.async_quotes = async_quotes
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.async_quotes.check_for_changes()
+            except Exception as e:
+                logger.error(f"Error checking for data changes: {e}")
@@ -0,0 +1,116 @@
+"""
+Synthetic datasets for the benchmark and query-plan scripts.
+Quote lines are built from the vocabulary of the bundled quote files, with the same
+word frequencies, so search and selection behave as they would on a larger corpus of
+real quotes. Votes and commands are spread randomly over the quotes and the last
+30 days, and the quote and stats counters agree with the generated vote rows.
+"""
+import os
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from models import Personality, Quote, Vote, Command, Stats
+from migrations import upgrade
+from database import get_engine, get_writer
+from quote_sync import read_quote_file, quote_row
+from command_rollup import count_commands, add_usage
+from config import PERSONALITIES, QUOTES_DIRECTORY
+
+BATCH_SIZE = 10000
+COMMANDS = ('random', 'top', 'szukaj', 'stats') + tuple(PERSONALITIES)
+
+
+def vocabulary():
+    """(words, weights) from every bundled quote file"""
+    words = Counter()
+    for file_name in PERSONALITIES:
+        path = os.path.join(QUOTES_DIRECTORY, f"{file_name}.txt")
+        if os.path.exists(path):
+            for _, content in read_quote_file(path):
+                words.update(content.split())
+    if not words:
+        raise RuntimeError(f"No quote files found in {QUOTES_DIRECTORY}")
+    return list(words), list(words.values())
+
+
+def synthetic_lines(count, rng):
+    """count quote texts of 4-16 words drawn from the bundled vocabulary"""
+    words, weights = vocabulary()
+    return [' '.join(rng.choices(words, weights, k=rng.randint(4, 16))) for _ in range(count)]
+
+
+def _batches(rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        yield rows[start:start + BATCH_SIZE]
+
+
+def seed(url, quotes, votes=0, commands=0, random_seed=0):
+    """Create a database at url holding `quotes` quotes, `votes` votes and `commands` commands
+
+    The database must be empty (or new); returns its engine.
+    """
+    rng = random.Random(random_seed)
+    engine = get_engine(url)
+    upgrade(engine)
+    personality_ids = list(range(1, len(PERSONALITIES) + 1))
+    lines = synthetic_lines(quotes, rng)
+
+    # Votes first, so the quote rows can be written with matching counters
+    ballots = {}
+    while len(ballots) < votes:
+        ballots[f"user-{rng.randrange(max(1, votes // 5))}", rng.randint(1, quotes)] = rng.choice((1, 1, -1))
+    counters = {}
+    for (_, quote_id), vote in ballots.items():
+        up, down = counters.get(quote_id, (0, 0))
+        counters[quote_id] = (up + (vote > 0), down + (vote < 0))
+
+    def write():
+        now = datetime.utcnow()
+        with engine.begin() as connection:
+            connection.execute(insert(Personality.__table__), [
+                {'id': personality_id, 'name': name, 'file_name': file_name, 'quotes_count': 0}
+                for personality_id, (file_name, name) in zip(personality_ids, PERSONALITIES.items())])
+
+            rows, numbers, stats = [], Counter(), {}
+            for quote_id, content in enumerate(lines, 1):
+                personality_id = personality_ids[quote_id % len(personality_ids)]
+                numbers[personality_id] += 1
+                up, down = counters.get(quote_id, (0, 0))
+                row = quote_row(personality_id, numbers[personality_id], content)
+                row.update(id=quote_id, upvotes=up, downvotes=down, score=up - down, use_count=0, created_at=now)
+                rows.append(row)
+                totals = stats.setdefault(personality_id, [0, 0])
+                totals[0] += up
+                totals[1] += down
+            for batch in _batches(rows):
+                connection.execute(insert(Quote.__table__), batch)
+            for personality_id in personality_ids:
+                connection.execute(Personality.__table__.update().
+                                   where(Personality.__table__.c.id == personality_id).
+                                   values(quotes_count=numbers[personality_id]))
+            connection.execute(insert(Stats.__table__), [
+                {'personality_id': personality_id, 'total_quotes_used': 0,
+                 'total_upvotes': stats.get(personality_id, [0, 0])[0],
+                 'total_downvotes': stats.get(personality_id, [0, 0])[1], 'updated_at': now}
+                for personality_id in personality_ids])
+
+            for batch in _batches([{'user_id': user_id, 'quote_id': quote_id, 'vote': vote, 'timestamp': now}
+                                   for (user_id, quote_id), vote in ballots.items()]):
+                connection.execute(insert(Vote.__table__), batch)
+
+            logged = []
+            for _ in range(commands):
+                command = rng.choice(COMMANDS)
+                quote_id = rng.randint(1, quotes) if command != 'stats' else None
+                logged.append({'user_id': f"user-{rng.randrange(1000)}", 'command': command, 'quote_id': quote_id,
+                               'timestamp': now - timedelta(seconds=rng.randrange(30 * 86400))})
+            for batch in _batches(logged):
+                connection.execute(insert(Command.__table__), batch)
+            add_usage(connection, count_commands(
+                (row['timestamp'], row['command'],
+                 personality_ids[row['quote_id'] % len(personality_ids)] if row['quote_id'] else None)
+                for row in logged))
+
+    get_writer(engine).run(write)
+    return engine
@@ -0,0 +1,85 @@
+"""
+Zulte Kroniki Database Benchmark
+Times the bot's hot paths (random quote, command log, votes, write-behind flush,
+dashboard totals) against a database URL, so SQLite and PostgreSQL deployments
+can be compared on the same quote files. It writes votes and commands, so point
+it at a scratch copy of the database.
+
+Usage: python benchmark_db.py [--url URL] [--iterations N] [--threads N]
+"""
+import time
+import random
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from database import get_engine, get_writer, pool_metrics
+from quotes_manager import QuotesManager
+import stats_service
+
+
+def measure(fn, iterations, threads=1):
+    """Per-call latencies in milliseconds of iterations calls of fn(i) spread over threads"""
+    def timed(i):
+        started = time.perf_counter()
+        fn(i)
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(threads) as pool:
+            latencies = list(pool.map(timed, range(iterations)))
+    else:
+        latencies = [timed(i) for i in range(iterations)]
+    return latencies, time.perf_counter() - started
+
+
+def report(name, latencies, elapsed):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<28} {len(latencies) / elapsed:>10.0f}/s  median {statistics.median(latencies):8.3f} ms"
+          f"  p95 {p95:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot's database hot paths")
+    parser.add_argument('--url', help="database URL (default: DATABASE_URL)")
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8, help="concurrent callers for the vote benchmark")
+    args = parser.parse_args()
+
+    engine = get_engine(args.url)
+    manager = QuotesManager(engine)
+    quote_ids = list(manager.corpus.locations)
+    if not quote_ids:
+        parser.error("the database has no quotes to benchmark with")
+    print(f"{engine.url.render_as_string(hide_password=True)}: {len(quote_ids)} quotes")
+    run = random.randrange(10 ** 9)
+
+    report("random quote + usage", *measure(lambda i: manager.get_random_quote(channel_id=i % 50),
+                                            args.iterations))
+    report("record command", *measure(lambda i: manager.record_command(f'bench-{run}-c{i}', 'random'),
+                                      args.iterations))
+    report("flush write-behind", *measure(lambda i: manager.usage_buffer.flush(), 1))
+    report("vote (1 caller)", *measure(
+        lambda i: manager.record_vote(f'bench-{run}-v{i}', random.choice(quote_ids), random.choice((1, -1))),
+        args.iterations))
+    report(f"vote ({args.threads} callers)", *measure(
+        lambda i: manager.record_vote(f'bench-{run}-t{i}', random.choice(quote_ids), 1),
+        args.iterations, args.threads))
+    report("vote batch (100)", *measure(
+        lambda i: manager.record_votes([(f'bench-{run}-b{i}-{j}',
+                                         random.choice(quote_ids), -1) for j in range(100)]),
+        max(1, args.iterations // 100)))
+
+    def dashboard_totals(i):
+        with manager.Session() as session:
+            stats_service.totals(session)
+    report("dashboard totals", *measure(dashboard_totals, max(1, args.iterations // 10)))
+
+    manager.close()
+    print(f"pool: {pool_metrics(engine)}")
+    print(f"writer: {get_writer(engine).metrics()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Zulte Kroniki Random Quote Benchmark
+Latency per call of /random and numbered quote lookups before and after the in-memory
+corpus, on scratch SQLite databases of synthetic quotes (10k, 100k and 1M by default).
+"Before" is the original query: load every quote as an ORM object and pick one, or
+filter on (personality_id, number). "After" is QuotesManager serving from the corpus.
+
+Usage: python benchmark_random.py [--sizes 10000 100000 1000000] [--iterations N] [--directory DIR]
+"""
+import os
+import random
+import argparse
+import statistics
+import tempfile
+from models import Quote
+from database import get_engine
+from quotes_manager import QuotesManager
+from bench_data import seed
+from benchmark_db import measure
+
+
+def median_ms(fn, iterations):
+    latencies, _ = measure(fn, iterations)
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark random and numbered quote lookups")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--iterations', type=int, default=2000, help="calls per measurement from the corpus")
+    parser.add_argument('--directory', help="where to create the databases (default: a new temporary directory)")
+    args = parser.parse_args()
+    directory = args.directory or tempfile.mkdtemp()
+
+    print(f"{'quotes':>8} {'lookup':<10} {'before ms':>10} {'after ms':>10} {'speedup':>9}")
+    for size in args.sizes:
+        path = os.path.join(directory, f"random-{size}.db")
+        url = f"sqlite:///{os.path.abspath(path)}"
+        engine = seed(url, size) if not os.path.exists(path) else get_engine(url)
+        manager = QuotesManager(engine)
+        buckets = list(manager.corpus.by_file_name.values())
+        # Loading every row per call is slow at 1M quotes, so the old path gets fewer calls
+        before_iterations = max(3, min(args.iterations, 20 * 10000 // size))
+
+        def random_before(i):
+            session = manager.Session()
+            try:
+                random.choice(session.query(Quote).all())
+            finally:
+                session.close()
+
+        def numbered_before(i):
+            bucket = buckets[i % len(buckets)]
+            session = manager.Session()
+            try:
+                session.query(Quote).filter_by(personality_id=bucket.personality.id,
+                                               number=random.randint(1, len(bucket))).first()
+            finally:
+                session.close()
+
+        def numbered_after(i):
+            bucket = buckets[i % len(buckets)]
+            manager.get_specific_quote(bucket.personality.file_name, random.randint(1, len(bucket)))
+
+        for name, before, after, iterations in (
+                ('random', random_before, lambda i: manager.get_random_quote(channel_id=i % 50), before_iterations),
+                ('numbered', numbered_before, numbered_after, args.iterations)):
+            before_ms = median_ms(before, iterations)
+            after_ms = median_ms(after, args.iterations)
+            print(f"{size:>8} {name:<10} {before_ms:>10.3f} {after_ms:>10.4f} {before_ms / after_ms:>8.0f}x")
+        manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Zulte Kroniki Random Sampler Benchmark
+Latency of /api/quotes/random's database work before and after the corpus sampler, on a
+scratch SQLite database of synthetic quotes (1M by default). "Before" is the original
+ORDER BY random() query (with LIMIT N for ?count=N); "after" samples ids from the
+corpus and reads only those rows by primary key, as the endpoint does now.
+
+Usage: python benchmark_sampler.py [--quotes N] [--counts 1 10 50] [--iterations N] [--database PATH]
+"""
+import os
+import argparse
+import statistics
+import tempfile
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from models import Quote
+from database import get_engine
+from quotes_manager import QuotesManager
+from bench_data import seed
+from benchmark_db import measure
+
+
+def median_ms(fn, iterations):
+    latencies, _ = measure(fn, iterations)
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ORDER BY random() with the corpus sampler")
+    parser.add_argument('--quotes', type=int, default=1000000)
+    parser.add_argument('--counts', type=int, nargs='+', default=[1, 10, 50], help="quotes per call")
+    parser.add_argument('--iterations', type=int, default=1000, help="calls per sampler measurement")
+    parser.add_argument('--database', help="SQLite file to seed or reuse (default: a new temporary file)")
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.database or os.path.join(tempfile.mkdtemp(), 'sampler.db'))
+    url = f"sqlite:///{path}"
+    engine = get_engine(url) if os.path.exists(path) else seed(url, args.quotes)
+    manager = QuotesManager(engine)
+    personality = next(iter(manager.corpus.by_file_name.values())).personality
+    print(f"{len(manager.corpus)} quotes, '{personality.file_name}' has {manager.corpus.count(personality.file_name)}")
+
+    def before(count, personality_id):
+        session = manager.Session()
+        try:
+            query = session.query(Quote).options(joinedload(Quote.personality))
+            if personality_id:
+                query = query.filter(Quote.personality_id == personality_id)
+            return query.order_by(func.random()).limit(count).all()
+        finally:
+            session.close()
+
+    def after(count, file_name):
+        sampled = manager.get_random_quotes(count, file_name)
+        session = manager.Session()
+        try:
+            return session.query(Quote).options(joinedload(Quote.personality)).\
+                filter(Quote.id.in_([quote.id for quote in sampled])).all()
+        finally:
+            session.close()
+
+    print(f"{'scope':<12} {'count':>5} {'before ms':>10} {'after ms':>9} {'speedup':>8}")
+    for scope, personality_id, file_name in (('all', None, None),
+                                             (personality.file_name, personality.id, personality.file_name)):
+        for count in args.counts:
+            before_ms = median_ms(lambda i: before(count, personality_id), 5)
+            after_ms = median_ms(lambda i: after(count, file_name), args.iterations)
+            print(f"{scope:<12} {count:>5} {before_ms:>10.1f} {after_ms:>9.3f} {before_ms / after_ms:>7.0f}x")
+    manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Zulte Kroniki Search Benchmark
+Latency of the search backend against the original LIKE '%query%' scan, on a scratch
+SQLite database of synthetic quotes (1M by default). Terms are picked from the bundled
+vocabulary: a rare word, a medium word, the most common word, a two-word query and a
+word with Polish letters typed without them. LIKE is timed as the original search
+(every match as an ORM object) and as a first page with a count; the index returns a
+ranked first page and the total.
+
+Usage: python benchmark_search.py [--quotes N] [--page N] [--iterations N] [--database PATH]
+"""
+import os
+import argparse
+import statistics
+import tempfile
+from sqlalchemy import func
+from models import Quote
+from database import get_engine
+from quotes_manager import QuotesManager
+from search_index import normalize
+from bench_data import seed, vocabulary
+from benchmark_db import measure
+
+POLISH_LETTERS = set('ąćęłńóśźżĄĆĘŁŃÓŚŹŻ')
+
+
+def median_ms(fn, iterations):
+    latencies, _ = measure(fn, iterations)
+    return statistics.median(latencies)
+
+
+def pick_terms(manager):
+    """{label: query} spanning rare to common words"""
+    words, weights = vocabulary()
+    ranked = sorted(((weight, word.strip('.,!?"()').lower()) for word, weight in zip(words, weights)),
+                    reverse=True)
+    ranked = [(weight, word) for weight, word in ranked if len(word) > 3 and word.isalpha()]
+    common = ranked[0][1]
+    medium = ranked[len(ranked) // 20][1]
+    rare = next(word for weight, word in reversed(ranked) if manager.search_quote_ids(word)[0])
+    polish = next(word for _, word in ranked if POLISH_LETTERS & set(word))
+    return {
+        'rare': rare,
+        'medium': medium,
+        'common': common,
+        'two words': f"{medium} {common}",
+        'no diacritics': normalize(polish)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the search index with LIKE scans")
+    parser.add_argument('--quotes', type=int, default=1000000)
+    parser.add_argument('--page', type=int, default=20, help="results per page")
+    parser.add_argument('--iterations', type=int, default=200, help="calls per index measurement")
+    parser.add_argument('--database', help="SQLite file to seed or reuse (default: a new temporary file)")
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.database or os.path.join(tempfile.mkdtemp(), 'search.db'))
+    url = f"sqlite:///{path}"
+    engine = get_engine(url) if os.path.exists(path) else seed(url, args.quotes)
+    manager = QuotesManager(engine)
+    print(f"{len(manager.corpus)} quotes")
+
+    def like_all(query):
+        session = manager.Session()
+        try:
+            return len(session.query(Quote).filter(Quote.content.like(f"%{query}%")).all())
+        finally:
+            session.close()
+
+    def like_page(query):
+        session = manager.Session()
+        try:
+            matches = session.query(Quote).filter(Quote.content.like(f"%{query}%"))
+            matches.with_entities(func.count(Quote.id)).scalar()
+            return matches.limit(args.page).all()
+        finally:
+            session.close()
+
+    print(f"{'query':<28} {'LIKE hits':>10} {'index hits':>10} {'LIKE all ms':>12} {'LIKE page ms':>13}"
+          f" {'index ms':>9}")
+    for label, query in pick_terms(manager).items():
+        like_hits = like_all(query)
+        index_hits = manager.search_quote_ids(query, limit=args.page)[0]
+        like_all_ms = median_ms(lambda i: like_all(query), 3)
+        like_page_ms = median_ms(lambda i: like_page(query), 5)
+        index_ms = median_ms(lambda i: manager.search_quote_ids(query, limit=args.page), args.iterations)
+        print(f"{f'{label} ({query})':<28} {like_hits:>10} {index_hits:>10} {like_all_ms:>12.1f} {like_page_ms:>13.1f}"
+              f" {index_ms:>9.3f}")
+    manager.close()
+
+
+if __name__ == "__main__":
+    main()
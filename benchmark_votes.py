@@ -0,0 +1,110 @@
+"""
+Zulte Kroniki Vote Load Test
+Stored votes per second under contention: many callers voting on a few hot quotes, as in a
+busy channel reacting to the same messages. "Before" is the original record_vote
+(SELECT the vote, load the quote, UPDATE the quote and up to two stats rows, each
+vote its own transaction); "after" is the upsert with coalesced counter batches,
+timed up to and including the final write-behind flush.
+
+Usage: python benchmark_votes.py [--quotes N] [--hot N] [--votes N] [--threads 1 8 32] [--url URL]
+"""
+import os
+import random
+import argparse
+import statistics
+import tempfile
+from datetime import datetime
+from models import Quote, Vote, Stats
+from database import get_engine, get_writer
+from quotes_manager import QuotesManager
+from bench_data import seed
+from benchmark_db import measure
+
+
+def record_vote_before(session_factory, user_id, quote_id, vote_value):
+    """The per-vote read-modify-write path that the upsert replaced"""
+    session = session_factory()
+    try:
+        existing = session.query(Vote).filter_by(user_id=user_id, quote_id=quote_id).first()
+        if existing and existing.vote == vote_value:
+            session.commit()
+            return
+        quote = session.get(Quote, quote_id)
+        stats = session.query(Stats).filter_by(personality_id=quote.personality_id)
+        if existing:
+            old_vote, existing.vote, existing.timestamp = existing.vote, vote_value, datetime.utcnow()
+            if old_vote == 1:
+                quote.upvotes -= 1
+                stats.update({'total_upvotes': Stats.total_upvotes - 1})
+            else:
+                quote.downvotes -= 1
+                stats.update({'total_downvotes': Stats.total_downvotes - 1})
+        else:
+            session.add(Vote(user_id=user_id, quote_id=quote_id, vote=vote_value))
+        if vote_value == 1:
+            quote.upvotes += 1
+            stats.update({'total_upvotes': Stats.total_upvotes + 1})
+        else:
+            quote.downvotes += 1
+            stats.update({'total_downvotes': Stats.total_downvotes + 1})
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def record_vote_after(manager, user_id, quote_id, vote_value):
+    if manager.record_vote(user_id, quote_id, vote_value) is None:
+        raise RuntimeError("vote was not recorded")
+
+
+def run(name, fn, votes, threads, finish=None):
+    errors = []
+
+    def vote(i):
+        try:
+            fn(i)
+        except Exception as e:
+            errors.append(e)
+
+    latencies, elapsed = measure(vote, votes, threads)
+    if finish:
+        elapsed += measure(lambda i: finish(), 1)[1]
+    p95 = sorted(latencies)[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<8} {threads:>7} {(votes - len(errors)) / elapsed:>10.0f} {statistics.median(latencies):>10.3f}"
+          f" {p95:>10.3f} {len(errors):>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Votes per second under contention on hot quotes")
+    parser.add_argument('--quotes', type=int, default=10000, help="size of the scratch database")
+    parser.add_argument('--hot', type=int, default=10, help="quotes that receive all the votes")
+    parser.add_argument('--votes', type=int, default=4000, help="votes per measurement")
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--url', help="scratch database to use (default: a new seeded SQLite file)")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'votes.db')}"
+    engine = get_engine(url) if args.url else seed(url, args.quotes)
+    manager = QuotesManager(engine)
+    hot = random.sample(list(manager.corpus.locations), args.hot)
+    print(f"{engine.url.render_as_string(hide_password=True)}: {len(manager.corpus)} quotes, {args.hot} hot")
+    print(f"{'path':<8} {'callers':>7} {'stored/s':>10} {'median ms':>10} {'p95 ms':>10} {'errors':>7}")
+
+    for threads in args.threads:
+        # Voters are drawn from a pool a quarter the size of the run, so some votes repeat or flip earlier ones
+        for name, record, finish in (
+                ('before', lambda *vote: record_vote_before(manager.Session, *vote), None),
+                ('after', lambda *vote: record_vote_after(manager, *vote), manager.usage_buffer.flush)):
+            voters = f"{name}-{threads}"
+            run(name, lambda i: record(f"{voters}-{random.randrange(args.votes // 4)}", random.choice(hot),
+                                       random.choice((1, -1))), args.votes, threads, finish)
+
+    manager.close()
+    print(f"writer: {get_writer(engine).metrics()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,19 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import asyncio
 import logging
 import requests
 from datetime import datetime, timedelta
 
-from config import TOKEN, COMMAND_PREFIX, PERSONALITIES, COLORS, API_BASE_URL
+from config import (TOKEN, COMMAND_PREFIX, PERSONALITIES, API_BASE_URL,
+                    DB_EXECUTOR_WORKERS, LOOP_LAG_INTERVAL, LOOP_LAG_WARN_THRESHOLD,
+                    REACTION_LISTEN_TIMEOUT, REACTION_WHEEL_TICK, EMBED_EDIT_WINDOW,
+                    CHANGE_CHECK_INTERVAL)
 from quotes_manager import QuotesManager
-from models import Quote, Personality, Command, Vote
+from async_quotes import AsyncQuotesManager, LoopLagMonitor, ChangeMonitor
+from reaction_dispatcher import ReactionDispatcher
+from edit_scheduler import EditScheduler
+from embeds import quote_embed, quote_title, quote_preview, quote_footer, PRIMARY_COLOR, ACCENT_COLOR
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -19,12 +24,24 @@ intents = discord.Intents.default()
 intents.message_content = True
 bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
 
-# Create quotes manager
+# Create quotes manager; handlers go through the async facade so SQL never runs on the event loop
 quotes_manager = QuotesManager()
+async_quotes = AsyncQuotesManager(quotes_manager, DB_EXECUTOR_WORKERS)
+loop_lag_monitor = LoopLagMonitor(LOOP_LAG_INTERVAL, LOOP_LAG_WARN_THRESHOLD)
+# Picks up /reload runs and vote imports from the web process
+change_monitor = ChangeMonitor(async_quotes, CHANGE_CHECK_INTERVAL)
+# Routes reactions on freshly sent quotes to their message's handler
+reaction_dispatcher = ReactionDispatcher(REACTION_LISTEN_TIMEOUT, REACTION_WHEEL_TICK)
+# Coalesces vote counter edits so a burst of reactions does not hit the edit rate limit
+edit_scheduler = EditScheduler(EMBED_EDIT_WINDOW)
 
 @bot.event
 async def on_ready():
     """Event called when the bot is ready"""
+    loop_lag_monitor.start()
+    reaction_dispatcher.start()
+    change_monitor.start()
+    
     try:
         synced = await bot.tree.sync()
         logger.info(f"Synced {len(synced)} command(s)")
@@ -34,71 +51,47 @@ async def on_ready():
     logger.info(f'Bot {bot.user.name} is connected and ready!')
     await bot.change_presence(activity=discord.Game(name="Zulte Kroniki | /random"))
 
+async def apply_vote(message, embed, quote_id, emoji, user_id):
+    """Record a reaction vote and show the updated counters in the message's embed"""
+    vote_value = 1 if emoji == '✅' else -1
+    updated_quote = await async_quotes.record_vote(str(user_id), quote_id, vote_value)
+    
+    # Update embed with the counts returned by the vote; bursts collapse into one edit
+    if updated_quote:
+        embed.set_footer(text=quote_footer(updated_quote))
+        edit_scheduler.schedule(message, embed)
+
 async def send_quote_embed(interaction, quote):
     """Send an embed with a quote"""
     if quote is None:
         embed = discord.Embed(
             title="Błąd",
             description="Nie znaleziono cytatu.",
-            color=int(COLORS['accent'].replace('#', ''), 16)
+            color=ACCENT_COLOR
         )
         await interaction.followup.send(embed=embed)
         return
     
-    personality_name = quote.personality.name
-    
-    embed = discord.Embed(
-        title=f"{personality_name} #{quote.number}",
-        description=quote.content,
-        color=int(COLORS['primary'].replace('#', ''), 16)
-    )
-    
-    embed.set_footer(text=f"👍 {quote.upvotes} | 👎 {quote.downvotes} | Użyto {quote.use_count} razy")
+    embed = quote_embed(quote, quotes_manager.corpus.personalities)
     
     # Record command usage
-    quotes_manager.record_command(
+    await async_quotes.record_command(
         user_id=str(interaction.user.id),
         command=interaction.command.name,
         quote_id=quote.id
     )
     
     message = await interaction.followup.send(embed=embed)
+    await async_quotes.remember_message(message.id, quote.id)
+    
+    # Votes on this message go straight to its embed while the registration lasts
+    async def on_vote(emoji, user_id):
+        await apply_vote(message, embed, quote.id, emoji, user_id)
+    reaction_dispatcher.register(message.id, on_vote)
     
     # Add reactions for voting
     await message.add_reaction('✅')
     await message.add_reaction('❌')
-    
-    # Create a check for the reaction event
-    def check(reaction, user):
-        return (
-            user.id == interaction.user.id and 
-            reaction.message.id == message.id and 
-            str(reaction.emoji) in ['✅', '❌']
-        )
-    
-    # Wait for reaction
-    try:
-        reaction, user = await bot.wait_for('reaction_add', timeout=60.0, check=check)
-        
-        # Record vote
-        vote_value = 1 if str(reaction.emoji) == '✅' else -1
-        quotes_manager.record_vote(str(user.id), quote.id, vote_value)
-        
-        # Update embed with new vote count
-        session = quotes_manager.Session()
-        updated_quote = session.query(Quote).get(quote.id)
-        
-        if updated_quote:
-            embed.set_footer(text=f"👍 {updated_quote.upvotes} | 👎 {updated_quote.downvotes} | Użyto {updated_quote.use_count} razy")
-            await message.edit(embed=embed)
-        
-        session.close()
-        
-    except asyncio.TimeoutError:
-        # Reaction timeout, no action needed
-        pass
-    except Exception as e:
-        logger.error(f"Error processing reaction: {e}")
 
 @bot.tree.command(name="random", description="Losowy cytat z dowolnej osobowości")
 async def random_quote(interaction: discord.Interaction):
@@ -106,11 +99,11 @@ async def random_quote(interaction: discord.Interaction):
     await interaction.response.defer()
     
     # Check cooldown
-    if not quotes_manager.check_cooldown(str(interaction.user.id), "random"):
+    if not await async_quotes.check_cooldown(str(interaction.user.id), "random"):
         await interaction.followup.send("Spokojnie! Odczekaj chwilę przed użyciem komendy ponownie.", ephemeral=True)
         return
     
-    quote = quotes_manager.get_random_quote()
+    quote = await async_quotes.get_random_quote(channel_id=interaction.channel_id)
     await send_quote_embed(interaction, quote)
 
 # Create command for each personality individually
@@ -123,7 +116,7 @@ def create_personality_command(personality_file_name, personality_name):
         
         if number is not None:
             # Check specific quote cooldown
-            can_use, minutes_left = quotes_manager.check_specific_quote_cooldown(
+            can_use, minutes_left = await async_quotes.check_specific_quote_cooldown(
                 str(interaction.user.id),
                 f"{personality_file_name}_{number}"
             )
@@ -135,7 +128,7 @@ def create_personality_command(personality_file_name, personality_name):
                 )
                 return
             
-            quote = quotes_manager.get_specific_quote(personality_file_name, number)
+            quote = await async_quotes.get_specific_quote(personality_file_name, number)
             if quote is None:
                 await interaction.followup.send(
                     f"Nie znaleziono cytatu #{number} dla {personality_name}.", 
@@ -144,14 +137,14 @@ def create_personality_command(personality_file_name, personality_name):
                 return
         else:
             # Check normal cooldown
-            if not quotes_manager.check_cooldown(str(interaction.user.id), personality_file_name):
+            if not await async_quotes.check_cooldown(str(interaction.user.id), personality_file_name):
                 await interaction.followup.send(
                     "Spokojnie! Odczekaj chwilę przed użyciem komendy ponownie.", 
                     ephemeral=True
                 )
                 return
             
-            quote = quotes_manager.get_random_quote(personality_file_name)
+            quote = await async_quotes.get_random_quote(personality_file_name, interaction.channel_id)
         
         await send_quote_embed(interaction, quote)
     
@@ -168,11 +161,11 @@ async def stats(interaction: discord.Interaction):
     """Show quote statistics"""
     await interaction.response.defer()
     
-    stats = quotes_manager.get_statistics()
+    stats = await async_quotes.get_statistics()
     
     embed = discord.Embed(
         title="Statystyki Zulte Kroniki",
-        color=int(COLORS['primary'].replace('#', ''), 16)
+        color=PRIMARY_COLOR
     )
     
     embed.add_field(name="Łączna liczba cytatów", value=stats.get('total_quotes', 0), inline=False)
@@ -189,6 +182,13 @@ async def stats(interaction: discord.Interaction):
             inline=True
         )
     
+    lag = loop_lag_monitor.snapshot()
+    cooldowns = await async_quotes.cooldown_metrics()
+    reactions = reaction_dispatcher.metrics()
+    embed.set_footer(text=f"Opóźnienie pętli zdarzeń: {lag['last_ms']:.1f} ms (max {lag['max_ms']:.1f} ms) | "
+                          f"Aktywne cooldowny: {cooldowns['live_entries']} | "
+                          f"Nasłuchiwane wiadomości: {reactions['active']}")
+    
     await interaction.followup.send(embed=embed)
 
 @bot.tree.command(name="top", description="Najlepsze cytaty")
@@ -199,7 +199,7 @@ async def top_quotes(interaction: discord.Interaction, limit: int = 5):
     if limit > 10:
         limit = 10  # Cap at 10 to avoid too long messages
     
-    top_quotes = quotes_manager.get_top_quotes(limit)
+    top_quotes = await async_quotes.get_top_quotes(limit)
     
     if not top_quotes:
         await interaction.followup.send("Nie ma jeszcze żadnych głosów na cytaty.")
@@ -207,13 +207,14 @@ async def top_quotes(interaction: discord.Interaction, limit: int = 5):
     
     embed = discord.Embed(
         title="Najlepsze Cytaty",
-        color=int(COLORS['primary'].replace('#', ''), 16)
+        color=PRIMARY_COLOR
     )
     
+    personalities = quotes_manager.corpus.personalities
     for i, quote in enumerate(top_quotes, 1):
         embed.add_field(
-            name=f"{i}. {quote.personality.name} #{quote.number} (Score: {quote.score})",
-            value=f"{quote.content[:100]}..." if len(quote.content) > 100 else quote.content,
+            name=f"{i}. {quote_title(quote, personalities)} (Score: {quote.score})",
+            value=quote_preview(quote),
             inline=False
         )
     
@@ -228,31 +229,27 @@ async def search(interaction: discord.Interaction, query: str, personality: str
     if personality and personality in PERSONALITIES:
         personality_file_name = personality
     
-    results = quotes_manager.search_quotes(query, personality_file_name)
+    total, results = await async_quotes.search_quotes_page(query, personality_file_name, limit=10)
     
     if not results:
         await interaction.followup.send(f"Nie znaleziono cytatów zawierających '{query}'.")
         return
     
-    if len(results) > 10:
+    if total > 10:
         embed = discord.Embed(
-            title=f"Znaleziono {len(results)} cytatów dla '{query}'",
+            title=f"Znaleziono {total} cytatów dla '{query}'",
             description="Wyświetlanie pierwszych 10 wyników:",
-            color=int(COLORS['accent'].replace('#', ''), 16)
+            color=ACCENT_COLOR
         )
-        results = results[:10]
     else:
         embed = discord.Embed(
-            title=f"Znaleziono {len(results)} cytatów dla '{query}'",
-            color=int(COLORS['accent'].replace('#', ''), 16)
+            title=f"Znaleziono {total} cytatów dla '{query}'",
+            color=ACCENT_COLOR
         )
     
+    personalities = quotes_manager.corpus.personalities
     for quote in results:
-        embed.add_field(
-            name=f"{quote.personality.name} #{quote.number}",
-            value=f"{quote.content[:100]}..." if len(quote.content) > 100 else quote.content,
-            inline=False
-        )
+        embed.add_field(name=quote_title(quote, personalities), value=quote_preview(quote), inline=False)
     
     await interaction.followup.send(embed=embed)
 
@@ -262,7 +259,7 @@ async def reload(interaction: discord.Interaction):
     """Reload quote database (admin only)"""
     await interaction.response.defer(ephemeral=True)
     
-    success = quotes_manager.reload_quotes()
+    success = await async_quotes.reload_quotes()
     
     if success:
         await interaction.followup.send("Baza cytatów została pomyślnie przeładowana!", ephemeral=True)
@@ -280,77 +277,50 @@ async def on_command_error(ctx, error):
         logger.error(f"Command error: {error}")
 
 @bot.event
-async def on_reaction_add(reaction, user):
-    """Handle reactions to quote messages"""
-    if user.bot:
+async def on_raw_reaction_add(payload):
+    """Handle reactions to quote messages, also on messages that are not in discord.py's message cache"""
+    if payload.user_id == bot.user.id or (payload.member and payload.member.bot):
         return  # Ignore bot reactions
     
-    message = reaction.message
-    
-    # Check if message is from bot and has an embed
-    if message.author != bot.user or not message.embeds:
+    # Only the bot's own messages carry quotes
+    if payload.message_author_id is not None and payload.message_author_id != bot.user.id:
         return
     
     # Check if reaction is valid for voting
-    if str(reaction.emoji) not in ['✅', '❌']:
-        return
-    
-    embed = message.embeds[0]
-    
-    # Extract quote information from embed title
-    title_parts = embed.title.split(' #')
-    if len(title_parts) != 2:
+    emoji = str(payload.emoji)
+    if emoji not in ['✅', '❌']:
         return
     
-    personality_name, number_str = title_parts
-    try:
-        number = int(number_str)
-    except ValueError:
+    # Freshly sent quotes have a registered handler
+    if await reaction_dispatcher.dispatch(payload.message_id, emoji, payload.user_id):
         return
     
-    # Find personality by name
-    personality_file_name = None
-    for file_name, name in PERSONALITIES.items():
-        if name == personality_name:
-            personality_file_name = file_name
-            break
-    
-    if not personality_file_name:
-        return
-    
-    # Get quote
-    session = quotes_manager.Session()
-    personality = session.query(Personality).filter_by(name=personality_name).first()
-    if not personality:
-        session.close()
-        return
-    
-    quote = session.query(Quote).filter_by(
-        personality_id=personality.id,
-        number=number
-    ).first()
-    session.close()
-    
-    if not quote:
-        return
-    
-    # Record vote
-    vote_value = 1 if str(reaction.emoji) == '✅' else -1
-    quotes_manager.record_vote(str(user.id), quote.id, vote_value)
-    
-    # Update embed with new vote count
-    session = quotes_manager.Session()
-    updated_quote = session.query(Quote).get(quote.id)
-    
-    if updated_quote:
-        embed.set_footer(text=f"👍 {updated_quote.upvotes} | 👎 {updated_quote.downvotes} | Użyto {updated_quote.use_count} razy")
-        await message.edit(embed=embed)
-    
-    session.close()
+    # Recent messages resolve from memory, older ones from the database; the embed is rebuilt from
+    # the quote, so the message itself is only fetched for quotes sent before messages were recorded
+    message = bot.get_partial_messageable(payload.channel_id).get_partial_message(payload.message_id)
+    quote = await async_quotes.quote_for_message(payload.message_id)
+    if quote:
+        embed = quote_embed(quote, quotes_manager.corpus.personalities)
+    else:
+        try:
+            message = await message.fetch()
+        except discord.HTTPException as e:
+            logger.error(f"Error fetching message {payload.message_id}: {e}")
+            return
+        if message.author.id != bot.user.id or not message.embeds:
+            return
+        embed = message.embeds[0]
+        quote = await async_quotes.quote_for_message(payload.message_id, embed.title)
+        if quote is None:
+            return
+    await apply_vote(message, embed, quote.id, emoji, payload.user_id)
 
 def run_bot():
     """Run the Discord bot"""
-    bot.run(TOKEN)
+    try:
+        bot.run(TOKEN)
+    finally:
+        async_quotes.close()
 
 if __name__ == "__main__":
     run_bot()
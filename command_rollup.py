@@ -0,0 +1,144 @@
+"""
+Hourly command usage rollup and archiving of raw command rows.
+Charts read command_usage, which holds at most one row per (hour, command, personality),
+so any range can be drawn without scanning the commands table.
+"""
+import csv
+import gzip
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, delete, func, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import Command, CommandUsage, Quote
+
+ARCHIVE_COLUMNS = ('id', 'user_id', 'command', 'quote_id', 'timestamp')
+
+
+def hour_bucket(timestamp):
+    """Start of the hour containing timestamp"""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def count_commands(commands):
+    """Counter of (hour, command, personality_id) for an iterable of (timestamp, command, personality_id)"""
+    counts = Counter()
+    for timestamp, command, personality_id in commands:
+        counts[hour_bucket(timestamp), command, personality_id or 0] += 1
+    return counts
+
+
+def add_usage(connection, counts):
+    """Add a Counter from count_commands to the rollup; runs inside the caller's transaction"""
+    if not counts:
+        return
+    usage = CommandUsage.__table__
+    rows = [{'hour': hour, 'command': command, 'personality_id': personality_id, 'count': count}
+            for (hour, command, personality_id), count in counts.items()]
+
+    if connection.dialect.name in ('postgresql', 'sqlite'):
+        dialect_insert = pg_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+        stmt = dialect_insert(usage)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[usage.c.hour, usage.c.command, usage.c.personality_id],
+            set_={'count': usage.c.count + stmt.excluded.count})
+        connection.execute(stmt, rows)
+        return
+
+    increment = update(usage).where(
+        usage.c.hour == bindparam('b_hour'),
+        usage.c.command == bindparam('b_command'),
+        usage.c.personality_id == bindparam('b_personality_id')
+    ).values(count=usage.c.count + bindparam('b_count'))
+    for row in rows:
+        changed = connection.execute(increment, {'b_' + key: value for key, value in row.items()}).rowcount
+        if not changed:
+            connection.execute(insert(usage), row)
+
+
+def rebuild(connection, since=None, batch_size=10000):
+    """Recompute the rollup from raw command rows, for every hour from `since` onwards
+
+    Used to backfill existing databases and as a compaction job after manual edits
+    to the commands table. Without `since` it starts at the oldest raw row, so hours
+    whose commands were already archived keep their counts. Returns the rows read.
+    """
+    usage = CommandUsage.__table__
+    commands = Command.__table__
+    quotes = Quote.__table__
+    if since is None:
+        since = connection.execute(select(func.min(commands.c.timestamp))).scalar()
+        if since is None:
+            return 0
+    since = hour_bucket(since)
+
+    connection.execute(delete(usage).where(usage.c.hour >= since))
+    query = select(commands.c.timestamp, commands.c.command, quotes.c.personality_id).\
+        select_from(commands.outerjoin(quotes, quotes.c.id == commands.c.quote_id)).\
+        where(commands.c.timestamp >= since)
+
+    counts = Counter()
+    read = 0
+    for partition in connection.execute(query.execution_options(yield_per=batch_size)).partitions():
+        counts.update(count_commands(partition))
+        read += len(partition)
+    add_usage(connection, counts)
+    return read
+
+
+def usage_series(session, start, end, granularity='day', command=None, personality_id=None):
+    """Zero-filled [{'date', 'count'}] between start and end (inclusive) per day or hour"""
+    usage = CommandUsage.__table__
+    if granularity == 'hour':
+        step, label = timedelta(hours=1), "%Y-%m-%d %H:00"
+        start, end = hour_bucket(start), hour_bucket(end)
+    else:
+        step, label = timedelta(days=1), "%Y-%m-%d"
+        start = datetime.combine(start.date(), datetime.min.time())
+        end = datetime.combine(end.date(), datetime.min.time())
+
+    query = select(usage.c.hour, func.sum(usage.c.count)).\
+        where(usage.c.hour >= start, usage.c.hour < end + step).group_by(usage.c.hour)
+    if command is not None:
+        query = query.where(usage.c.command == command)
+    if personality_id is not None:
+        query = query.where(usage.c.personality_id == personality_id)
+
+    counts = Counter()
+    for hour, count in session.execute(query):
+        counts[hour.strftime(label)] += count or 0
+
+    series = []
+    bucket = start
+    while bucket <= end:
+        key = bucket.strftime(label)
+        series.append({'date': key, 'count': counts.get(key, 0)})
+        bucket += step
+    return series
+
+
+def archive_commands(connection, before, path, batch_size=10000):
+    """Move command rows older than `before` into a gzipped CSV file and return how many moved
+
+    The rollup already counts these rows, so charts are unaffected. `before` should be
+    the start of an hour, so rebuild() never recounts an hour whose rows were only
+    partly archived. Rows are deleted only after the file is fully written; runs
+    inside the caller's transaction.
+    """
+    commands = Command.__table__
+    query = select(*(commands.c[column] for column in ARCHIVE_COLUMNS)).\
+        where(commands.c.timestamp < before).order_by(commands.c.id)
+
+    archived = 0
+    last_id = None
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(ARCHIVE_COLUMNS)
+        for partition in connection.execute(query.execution_options(yield_per=batch_size)).partitions():
+            writer.writerows([*row[:-1], row.timestamp.isoformat()] for row in partition)
+            archived += len(partition)
+            last_id = partition[-1].id
+
+    if archived:
+        connection.execute(delete(commands).where(commands.c.timestamp < before, commands.c.id <= last_id))
+    return archived
@@ -7,6 +7,16 @@ COMMAND_PREFIX = '/'
 # Anti-spam Configuration
 COOLDOWN_TIME = 6  # seconds
 SPECIFIC_QUOTE_COOLDOWN = 15 * 60  # 15 minutes in seconds
+COOLDOWN_BACKEND = os.getenv('COOLDOWN_BACKEND', 'memory')  # 'memory' or 'sqlite' to share across shards
+COOLDOWN_MAX_ENTRIES = 100000  # in-memory cap; the soonest-expiring entries are evicted beyond it
+COOLDOWN_DB_PATH = os.getenv('COOLDOWN_DB_PATH', 'cooldowns.db')
+
+# Random quote selection: weight = exp(SCORE_WEIGHT * score), times RECENT_PENALTY while a quote
+# was used within RECENT_WINDOW; each channel also avoids its last CHANNEL_HISTORY quotes
+SELECTION_SCORE_WEIGHT = float(os.getenv('SELECTION_SCORE_WEIGHT', 0.1))  # 0 ignores votes
+SELECTION_RECENT_PENALTY = float(os.getenv('SELECTION_RECENT_PENALTY', 0.1))  # 1 ignores recent use
+SELECTION_RECENT_WINDOW = 6 * 60 * 60  # seconds
+SELECTION_CHANNEL_HISTORY = 50
 
 # Personalities
 PERSONALITIES = {
@@ -20,13 +30,71 @@ PERSONALITIES = {
 }
 
 # Database Configuration
-DATABASE_URL = os.getenv('DATABASE_URL')
+# Defaults to the bundled SQLite file; set a postgresql:// URL to use PostgreSQL
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///quotes.db')
+
+# Connection pool, one per process (see database.py)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 5))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 15000))  # Postgres only
+DB_SSLMODE = os.getenv('DB_SSLMODE', 'require')  # Postgres only; empty to use the driver default
+
+# SQLite tuning (WAL journaling is always on for file databases)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 10000))  # wait for the other process' writer
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')  # NORMAL is durable across app crashes in WAL
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # bytes
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+
+# Write-behind batching of usage counters and command log
+USAGE_FLUSH_INTERVAL = float(os.getenv('USAGE_FLUSH_INTERVAL', 5))  # seconds
+USAGE_FLUSH_THRESHOLD = int(os.getenv('USAGE_FLUSH_THRESHOLD', 500))  # pending quotes + commands
+
+# Raw command rows older than this many days can be moved to gzipped CSV files
+# with archive_commands.py; the hourly rollup keeps their counts (0 keeps everything)
+COMMAND_RETENTION_DAYS = int(os.getenv('COMMAND_RETENTION_DAYS', 0))
+COMMAND_ARCHIVE_DIRECTORY = os.getenv('COMMAND_ARCHIVE_DIRECTORY', 'archive')
+
+# Bot database offload and event loop monitoring
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', 4))
+LOOP_LAG_INTERVAL = 0.5  # seconds between event loop probes
+LOOP_LAG_WARN_THRESHOLD = 0.01  # seconds of lag that gets logged as a warning
+
+# Sent quote messages remembered in memory for routing reactions; older ones are looked up in quote_messages
+MESSAGE_MAP_MAX_ENTRIES = int(os.getenv('MESSAGE_MAP_MAX_ENTRIES', 50000))
+
+# Seconds between checks for quote reloads (and vote imports) committed by other processes
+CHANGE_CHECK_INTERVAL = float(os.getenv('CHANGE_CHECK_INTERVAL', 5))
+
+# Sent quote messages keep a registered reaction handler this long (seconds), expired on a
+# timing wheel advancing every REACTION_WHEEL_TICK; later reactions go through the message map
+REACTION_LISTEN_TIMEOUT = 60.0
+REACTION_WHEEL_TICK = 1.0
+
+# Vote counter edits of one message are coalesced and sent at most once per this many seconds
+EMBED_EDIT_WINDOW = float(os.getenv('EMBED_EDIT_WINDOW', 2.0))
+
+# Quote search: 'memory' uses the in-process inverted index, 'postgres' the tsvector GIN index
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'memory')
 
 # Web Dashboard Configuration
 SECRET_KEY = os.getenv('SESSION_SECRET', 'zulte-kroniki-secret-key')
 HOST = '0.0.0.0'
 PORT = 5000
 
+API_MAX_RANDOM_QUOTES = 50  # upper bound for /api/quotes/random?count=N
+API_MAX_PAGE_SIZE = 1000  # upper bound for /api/quotes?limit=N
+API_MAX_VOTE_BATCH = 10000  # records per /api/votes/batch request
+
+# Dashboard response cache: 'memory' per process, or 'sqlite' to share rendered pages and
+# invalidation counters between gunicorn workers and the bot on the same host
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 30))  # seconds
+RESPONSE_CACHE_MAX_ENTRIES = 256
+RESPONSE_CACHE_DB_PATH = os.getenv('RESPONSE_CACHE_DB_PATH', 'response_cache.db')
+
 # Style Configuration
 COLORS = {
     'primary': '#FFD700',  # golden yellow
@@ -37,6 +105,7 @@ COLORS = {
 
 # Quotes Files Path
 QUOTES_DIRECTORY = 'attached_assets'
+QUOTE_IMPORT_CHUNK_SIZE = 10000  # rows per COPY / executemany batch when bulk loading quote files
 
 # API endpoint for the bot
 API_BASE_URL = f'http://127.0.0.1:{PORT}/api'
@@ -0,0 +1,144 @@
+"""
+Expiring cooldown storage for anti-spam checks.
+Entries disappear once their cooldown has passed, so memory stays proportional
+to the users who are actually cooling down rather than everyone ever seen.
+"""
+import heapq
+import sqlite3
+import threading
+import time
+
+
+class MemoryCooldownBackend:
+    """Per-process store: a dict of expiries plus a min-heap for pruning and capacity eviction"""
+
+    blocking = False  # cheap enough to call from the event loop
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._expiries = {}  # {key: expiry on the monotonic clock}
+        self._heap = []  # (expiry, key), may contain superseded entries
+        self._lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+    def acquire(self, key, ttl):
+        """Start a cooldown for key unless one is running; return seconds left (0 when acquired)"""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            expiry = self._expiries.get(key)
+            if expiry is not None and expiry > now:
+                return expiry - now
+
+            expiry = now + ttl
+            self._expiries[key] = expiry
+            heapq.heappush(self._heap, (expiry, key))
+            while len(self._expiries) > self.max_entries:
+                self._pop(count_as_eviction=True)
+            return 0
+
+    def _prune(self, now):
+        while self._heap and self._heap[0][0] <= now:
+            self._pop(count_as_eviction=False)
+
+    def _pop(self, count_as_eviction):
+        expiry, key = heapq.heappop(self._heap)
+        if self._expiries.get(key) == expiry:
+            del self._expiries[key]
+            if count_as_eviction:
+                self.evicted += 1
+            else:
+                self.expired += 1
+
+    def metrics(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            return {'live_entries': len(self._expiries), 'expired': self.expired, 'evicted': self.evicted}
+
+
+class SQLiteCooldownBackend:
+    """Cooldowns in a local SQLite file so several bot shards or processes share them"""
+
+    PRUNE_EVERY = 1000  # acquisitions between sweeps of expired rows
+    blocking = True  # file I/O and lock waits, keep off the event loop
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._operations = 0
+        self.expired = 0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cooldowns (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_cooldowns_expires_at ON cooldowns (expires_at)")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def acquire(self, key, ttl):
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            changed = connection.execute(
+                "INSERT INTO cooldowns (key, expires_at) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET expires_at = excluded.expires_at "
+                "WHERE cooldowns.expires_at <= ?",
+                (key, now + ttl, now)).rowcount
+            remaining = 0
+            if not changed:
+                expires_at = connection.execute(
+                    "SELECT expires_at FROM cooldowns WHERE key = ?", (key,)).fetchone()[0]
+                remaining = max(0.0, expires_at - now)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        self._operations += 1
+        if self._operations % self.PRUNE_EVERY == 0:
+            self._prune(now)
+        return remaining
+
+    def _prune(self, now):
+        connection = self._connection()
+        self.expired += connection.execute("DELETE FROM cooldowns WHERE expires_at <= ?", (now,)).rowcount
+
+    def metrics(self):
+        now = time.time()
+        self._prune(now)
+        live = self._connection().execute("SELECT COUNT(*) FROM cooldowns").fetchone()[0]
+        return {'live_entries': live, 'expired': self.expired, 'evicted': 0}
+
+
+class CooldownStore:
+    """Front end used by QuotesManager; the backend decides where cooldowns live"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @property
+    def blocking(self):
+        """True when checks may wait on disk or other processes"""
+        return self.backend.blocking
+
+    def check(self, key, ttl):
+        """Return (allowed, seconds_left); an allowed check starts a new cooldown"""
+        remaining = self.backend.acquire(key, ttl)
+        return remaining <= 0, remaining
+
+    def metrics(self):
+        """Live entries, expired entries pruned and entries evicted for capacity"""
+        return self.backend.metrics()
+
+
+def create_cooldown_store(backend, max_entries, sqlite_path):
+    if backend == 'sqlite':
+        return CooldownStore(SQLiteCooldownBackend(sqlite_path))
+    return CooldownStore(MemoryCooldownBackend(max_entries))
@@ -0,0 +1,67 @@
+"""
+Streaming exports of the quotes, votes and commands tables.
+Rows are read through a server-side cursor in fixed-size partitions and encoded
+(and optionally gzipped) one partition at a time, so memory use does not grow
+with the size of the table.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from sqlalchemy import select
+from models import Quote, Vote, Command
+
+# Exported columns and the timestamp used for ?since= on each table
+EXPORTS = {
+    'quotes': (Quote.__table__, ('id', 'personality_id', 'number', 'content', 'upvotes', 'downvotes',
+                                 'score', 'use_count', 'last_used', 'created_at'), 'created_at'),
+    'votes': (Vote.__table__, ('id', 'user_id', 'quote_id', 'vote', 'timestamp'), 'timestamp'),
+    'commands': (Command.__table__, ('id', 'user_id', 'command', 'quote_id', 'timestamp'), 'timestamp'),
+}
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _ndjson(columns, rows):
+    return ''.join(json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False) + '\n'
+                   for row in rows)
+
+
+def _csv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_plain(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+def export_rows(connection, table_name, fmt='ndjson', since_id=None, since=None, batch_size=1000):
+    """Yield encoded text chunks for a table, in id order
+
+    since_id exports rows with a larger id; since exports rows whose timestamp column
+    is at or after the given datetime. Both can be combined.
+    """
+    table, columns, timestamp_column = EXPORTS[table_name]
+    query = select(*(table.c[column] for column in columns)).order_by(table.c.id)
+    if since_id is not None:
+        query = query.where(table.c.id > since_id)
+    if since is not None:
+        query = query.where(table.c[timestamp_column] >= since)
+
+    if fmt == 'csv':
+        yield _csv([columns])
+    result = connection.execute(query.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield _ndjson(columns, partition) if fmt == 'ndjson' else _csv(partition)
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of text chunks into a single gzip member as it goes"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,34 @@
+"""
+Change counters shared through the database.
+A process that reloads quotes or imports votes bumps a counter in the same transaction;
+every other process (bot, gunicorn workers, on any host) polls the counters and
+reloads what changed. See QuotesManager.check_for_changes.
+"""
+from sqlalchemy import select, update, insert
+from models import DataVersion
+from response_cache import VOTES, QUOTES
+
+NAMES = (QUOTES, VOTES)
+
+
+def seed(connection):
+    """Insert the missing counter rows; returns True if any were added"""
+    table = DataVersion.__table__
+    existing = set(connection.execute(select(table.c.name)).scalars())
+    missing = [{'name': name, 'version': 0} for name in NAMES if name not in existing]
+    if missing:
+        connection.execute(insert(table), missing)
+    return bool(missing)
+
+
+def bump(connection, name):
+    """Increment a counter inside the caller's transaction and return its new value"""
+    table = DataVersion.__table__
+    connection.execute(update(table).where(table.c.name == name).values(version=table.c.version + 1))
+    return connection.execute(select(table.c.version).where(table.c.name == name)).scalar()
+
+
+def current(connection):
+    """{name: version} for every counter"""
+    table = DataVersion.__table__
+    return dict(connection.execute(select(table.c.name, table.c.version)).all())
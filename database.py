@@ -0,0 +1,206 @@
+"""
+Shared database engine.
+Every component in a process (QuotesManager, the web app, CLI tools) uses the engine
+from get_engine(), so each process opens exactly one connection pool. Connections per
+process are at most DB_POOL_SIZE + DB_MAX_OVERFLOW; size them so that
+(gunicorn workers + bot processes) * that number stays below Postgres max_connections.
+
+SQLite files run in WAL mode, so readers never wait for the writer. Write transactions
+go through a per-process WriteQueue, which runs them one at a time and starts them with
+BEGIN IMMEDIATE so the bot and dashboard processes queue on SQLite's busy timeout
+instead of failing to upgrade a read lock.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from config import (DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+                    DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT_MS, DB_SSLMODE, SQLITE_BUSY_TIMEOUT_MS,
+                    SQLITE_SYNCHRONOUS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB)
+
+_engines = {}
+_write_queues = {}
+_lock = threading.Lock()
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records how long callers wait to check out a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def recreate(self):
+        # Keep the counters when the pool is recreated (e.g. after engine.dispose())
+        pool = super().recreate()
+        pool.checkouts, pool.timeouts = self.checkouts, self.timeouts
+        pool.wait_total, pool.wait_max = self.wait_total, self.wait_max
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        self.checkouts += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        return connection
+
+    def metrics(self):
+        return {
+            'size': self.size(),
+            'checked_out': self.checkedout(),
+            'overflow': max(0, self.overflow()),
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            'wait_max_ms': round(self.wait_max * 1000, 3)
+        }
+
+
+def engine_options(url):
+    """create_engine keyword arguments for a database URL"""
+    if url.startswith('postgres'):
+        connect_args = {'options': f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+        if DB_SSLMODE:
+            connect_args['sslmode'] = DB_SSLMODE
+        return {
+            'poolclass': MeteredQueuePool,
+            'pool_size': DB_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'pool_timeout': DB_POOL_TIMEOUT,
+            'pool_recycle': DB_POOL_RECYCLE,
+            'pool_pre_ping': DB_POOL_PRE_PING,
+            'connect_args': connect_args
+        }
+    if is_sqlite_file(url):
+        return {
+            'poolclass': MeteredQueuePool,
+            'pool_size': DB_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'pool_timeout': DB_POOL_TIMEOUT,
+            'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000, 'check_same_thread': False}
+        }
+    return {}
+
+
+def is_sqlite_file(url):
+    return url.startswith('sqlite') and ':memory:' not in url and url.rstrip('/') not in ('sqlite:', 'sqlite+pysqlite:')
+
+
+def _configure_sqlite(engine):
+    """WAL journaling, tuned pragmas and explicit BEGINs for a file-backed SQLite engine"""
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, _):
+        # Let SQLAlchemy's begin event issue BEGIN instead of the driver's implicit one
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def begin(connection):
+        writer = _write_queues.get(engine)
+        immediate = writer is not None and writer.is_writer_thread()
+        connection.exec_driver_sql("BEGIN IMMEDIATE" if immediate else "BEGIN")
+
+
+class WriteQueue:
+    """Runs write transactions one at a time on a dedicated thread"""
+
+    def __init__(self, name):
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        self.completed = 0
+        self.wait_total = 0.0
+
+    def is_writer_thread(self):
+        return threading.current_thread() is self._thread
+
+    def _run(self):
+        while True:
+            queued_at, future, fn, args, kwargs = self._jobs.get()
+            self.wait_total += time.perf_counter() - queued_at
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+            self.completed += 1
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn on the writer thread and return its result (inline if already on it)"""
+        if self.is_writer_thread():
+            return fn(*args, **kwargs)
+        future = Future()
+        self._jobs.put((time.perf_counter(), future, fn, args, kwargs))
+        return future.result()
+
+    def metrics(self):
+        return {
+            'queued': self._jobs.qsize(),
+            'completed': self.completed,
+            'wait_avg_ms': round(self.wait_total / self.completed * 1000, 3) if self.completed else 0.0
+        }
+
+
+class InlineWriter:
+    """Writer for servers with row-level locking: runs the transaction in the calling thread"""
+
+    @staticmethod
+    def run(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    @staticmethod
+    def metrics():
+        return {}
+
+
+def get_engine(url=None):
+    """The process-wide engine for url (DATABASE_URL by default)"""
+    url = url or os.environ.get('DATABASE_URL', DATABASE_URL)
+    with _lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = _engines[url] = create_engine(url, **engine_options(url))
+            if is_sqlite_file(url):
+                _configure_sqlite(engine)
+        return engine
+
+
+def get_writer(engine):
+    """The engine's write queue: a single writer thread for SQLite files, inline elsewhere"""
+    if not is_sqlite_file(str(engine.url)):
+        return InlineWriter
+    with _lock:
+        writer = _write_queues.get(engine)
+        if writer is None:
+            writer = _write_queues[engine] = WriteQueue(f"sqlite-writer-{os.path.basename(engine.url.database)}")
+        return writer
+
+
+def pool_metrics(engine):
+    """Checkout and wait counters of an engine's pool, or its basic status for other pools"""
+    pool = engine.pool
+    if isinstance(pool, MeteredQueuePool):
+        return pool.metrics()
+    return {'status': pool.status()}
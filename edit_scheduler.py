@@ -0,0 +1,85 @@
+"""
+Debounced message edits for vote counters.
+A burst of votes on one quote becomes one edit right away and at most one more per
+window, always carrying the newest embed. When Discord answers an edit with 429, the
+channel's edit bucket is paused for the time the rate-limit headers ask for.
+"""
+import asyncio
+import logging
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+def retry_after(error, default):
+    """Seconds to wait according to a rate-limit error and its response headers"""
+    if isinstance(error, discord.RateLimited):
+        return error.retry_after
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    for header in ('X-RateLimit-Reset-After', 'Retry-After'):
+        try:
+            return float(headers[header])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return default
+
+
+class EditScheduler:
+    """Coalesces embed edits per message and sends at most one per window"""
+
+    def __init__(self, window):
+        self.window = window
+        self._pending = {}  # {message_id: (message, embed)} newest embed waiting to be sent
+        self._tasks = {}  # {message_id: task sending that message's edits}
+        self._blocked_until = {}  # {channel_id: loop time its edit bucket is free again}
+        self.requested = 0
+        self.edits = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+
+    def schedule(self, message, embed):
+        """Queue an edit of message to show embed, replacing any edit still waiting"""
+        self.requested += 1
+        if message.id in self._pending:
+            self.coalesced += 1
+        self._pending[message.id] = (message, embed)
+        if message.id not in self._tasks:
+            self._tasks[message.id] = asyncio.get_running_loop().create_task(self._send(message.id))
+
+    async def _send(self, message_id):
+        loop = asyncio.get_running_loop()
+        try:
+            while message_id in self._pending:
+                message, embed = self._pending[message_id]
+                channel_id = message.channel.id
+                delay = self._blocked_until.get(channel_id, 0) - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                self._blocked_until.pop(channel_id, None)
+
+                del self._pending[message_id]
+                try:
+                    await message.edit(embed=embed)
+                    self.edits += 1
+                except Exception as e:
+                    if isinstance(e, discord.RateLimited) or getattr(e, 'status', None) == 429:
+                        self.rate_limited += 1
+                        self._blocked_until[channel_id] = loop.time() + retry_after(e, self.window)
+                        # Retry with this embed unless a newer one arrived meanwhile
+                        self._pending.setdefault(message_id, (message, embed))
+                        continue
+                    logger.error(f"Error editing message {message_id}: {e}")
+                await asyncio.sleep(self.window)
+        finally:
+            del self._tasks[message_id]
+
+    def metrics(self):
+        return {
+            'pending': len(self._pending),
+            'sending': len(self._tasks),
+            'requested': self.requested,
+            'edits': self.edits,
+            'coalesced': self.coalesced,
+            'rate_limited': self.rate_limited
+        }
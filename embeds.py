@@ -0,0 +1,35 @@
+"""
+Discord embeds for quotes.
+Colors are parsed once at import, and personality names come from the corpus's
+{personality_id: PersonalityInfo} map, never from a lazy ORM relationship, so quotes
+loaded by any session (or none) render the same way.
+"""
+import discord
+from config import COLORS
+
+PRIMARY_COLOR = int(COLORS['primary'].lstrip('#'), 16)
+ACCENT_COLOR = int(COLORS['accent'].lstrip('#'), 16)
+PREVIEW_LENGTH = 100  # characters of a quote shown in /top and /szukaj lists
+
+
+def quote_title(quote, personalities):
+    """Name and number of a quote; personalities maps personality ids to PersonalityInfo"""
+    personality = personalities.get(quote.personality_id)
+    return f"{personality.name if personality else '?'} #{quote.number}"
+
+
+def quote_preview(quote):
+    content = quote.content
+    return f"{content[:PREVIEW_LENGTH]}..." if len(content) > PREVIEW_LENGTH else content
+
+
+def quote_footer(quote):
+    """Footer text with a quote's vote and usage counters"""
+    return f"👍 {quote.upvotes} | 👎 {quote.downvotes} | Użyto {quote.use_count} razy"
+
+
+def quote_embed(quote, personalities):
+    """Embed for a single quote with its current counters in the footer"""
+    embed = discord.Embed(title=quote_title(quote, personalities), description=quote.content, color=PRIMARY_COLOR)
+    embed.set_footer(text=quote_footer(quote))
+    return embed
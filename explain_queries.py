@@ -0,0 +1,148 @@
+"""
+Zulte Kroniki Query Plan Check
+Runs every QuotesManager and app.py query path against a seeded database, records
+the statements each one sends and asks the database for their plans (EXPLAIN QUERY
+PLAN on SQLite, EXPLAIN on PostgreSQL). Exits with status 1 when a plan reads all
+of quotes, votes or commands instead of using an index.
+
+Loading the corpus, rebuilding scores and full exports read whole tables on purpose
+and are not checked.
+
+Usage: python explain_queries.py [--quotes N] [--votes N] [--commands N] [--database PATH]
+       python explain_queries.py --url URL   (an existing, populated database)
+"""
+import os
+import re
+import sys
+import argparse
+import tempfile
+from sqlalchemy import event
+
+CHECKED_TABLES = ('quotes', 'votes', 'commands')
+# SQLite: "SCAN quotes" without "USING ... INDEX"; PostgreSQL: "Seq Scan on quotes"
+SQLITE_FULL_SCAN = re.compile(rf"^SCAN ({'|'.join(CHECKED_TABLES)})(_\d+)?\b(?!.*USING)")
+POSTGRES_FULL_SCAN = re.compile(rf"Seq Scan on ({'|'.join(CHECKED_TABLES)})\b")
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')
+
+
+def record_statements(engine, fn):
+    """[(statement, parameters)] sent to the database while fn runs"""
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        fn()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return statements
+
+
+def full_scans(connection, statement, parameters):
+    """Plan lines of a statement that read a checked table from start to end"""
+    if connection.dialect.name == 'sqlite':
+        plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+        pattern = SQLITE_FULL_SCAN
+    else:
+        plan = [row[0] for row in connection.exec_driver_sql(f"EXPLAIN {statement}", parameters)]
+        pattern = POSTGRES_FULL_SCAN
+    return [line.strip() for line in plan if pattern.search(line.strip())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that query paths use indexes")
+    parser.add_argument('--quotes', type=int, default=1000000)
+    parser.add_argument('--votes', type=int, default=200000)
+    parser.add_argument('--commands', type=int, default=200000)
+    parser.add_argument('--database', help="SQLite file to seed (default: a new temporary file)")
+    parser.add_argument('--url', help="explain against this populated database instead of seeding one")
+    args = parser.parse_args()
+
+    # Settings are read when config is first imported
+    os.environ.setdefault('RESPONSE_CACHE_BACKEND', 'memory')
+    os.environ['CHANGE_CHECK_INTERVAL'] = '0'  # check on every request, so the check itself is explained
+    if args.url:
+        url = args.url
+    else:
+        from bench_data import seed
+        path = os.path.abspath(args.database or os.path.join(tempfile.mkdtemp(), 'explain.db'))
+        url = f"sqlite:///{path}"
+        print(f"Seeding {path} with {args.quotes} quotes, {args.votes} votes and {args.commands} commands")
+        seed(url, args.quotes, args.votes, args.commands)
+    os.environ['DATABASE_URL'] = url
+    from app import app, engine, quotes_manager  # noqa: E402 - reads DATABASE_URL at import
+
+    client = app.test_client()
+    corpus = quotes_manager.corpus
+    quote = corpus.random()
+    personality = corpus.personalities[quote.personality_id]
+    word = next(word for word in quote.content.split() if len(word) > 3)
+    cursor = client.get('/api/quotes?limit=20').get_json()['next_cursor']
+    last_id = max(corpus.locations)
+
+    def get(url):
+        response = client.get(url)
+        response.get_data()  # run streamed responses to the end
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+
+    def post(url, payload):
+        response = client.post(url, json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"POST {url} returned {response.status_code}")
+
+    def flush_after(fn):
+        fn()
+        quotes_manager.usage_buffer.flush()
+
+    checks = {
+        'GET /': lambda: get('/'),
+        'GET /stats': lambda: get('/stats'),
+        'GET /quotes': lambda: get('/quotes'),
+        'GET /quotes?personality=': lambda: get(f'/quotes?personality={personality.file_name}&after={cursor}'),
+        'GET /quotes?search=': lambda: get(f'/quotes?search={word}'),
+        'GET /api/quotes': lambda: get(f'/api/quotes?limit=50&after={cursor}'),
+        'GET /api/quotes?personality=': lambda: get(f'/api/quotes?personality={personality.file_name}&limit=50'),
+        'GET /api/quotes/random': lambda: get(f'/api/quotes/random?count=10&personality={personality.file_name}'),
+        'GET /api/stats': lambda: get('/api/stats'),
+        'GET /api/export?since_id=': lambda: [get(f'/api/export/{table}?since_id={last_id - 100}')
+                                              for table in ('quotes', 'votes', 'commands')],
+        'POST /api/quotes/<id>/vote': lambda: post(f'/api/quotes/{quote.id}/vote', {'user_id': 'explain', 'vote': 1}),
+        'POST /api/votes/batch': lambda: post('/api/votes/batch', [
+            {'user_id': 'explain', 'quote_id': quote_id, 'vote': -1} for quote_id in list(corpus.locations)[:50]]),
+        'bot /random + usage flush': lambda: flush_after(lambda: [
+            quotes_manager.record_command('explain', 'random', quotes_manager.get_random_quote(channel_id=1).id),
+            quotes_manager.remember_message(10 ** 12, quote.id)]),
+        'bot vote + flush': lambda: flush_after(lambda: quotes_manager.record_vote('explain', quote.id, -1)),
+        'bot reaction lookup': lambda: quotes_manager.quote_for_message(10 ** 12 + 1),
+        'bot /stats': quotes_manager.get_statistics,
+        'bot /szukaj': lambda: quotes_manager.search_quotes_page(word, limit=10),
+        'bot /top': lambda: quotes_manager.get_top_quotes(10),
+        'change check': quotes_manager.check_for_changes,
+    }
+
+    failures = []
+    with engine.connect() as connection:
+        for name, fn in checks.items():
+            explained = 0
+            for statement, parameters in record_statements(engine, fn):
+                if not statement.lstrip().upper().startswith(EXPLAINED):
+                    continue
+                explained += 1
+                for line in full_scans(connection, statement, parameters):
+                    failures.append(name)
+                    print(f"FULL SCAN  {name}: {line}\n           {' '.join(statement.split())[:300]}")
+            print(f"{name:<36} {explained:>3} statements explained")
+
+    quotes_manager.close()
+    if failures:
+        print(f"Full table scans in: {', '.join(sorted(set(failures)))}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Zulte Kroniki Quote Importer
+Bulk-loads an arbitrary (possibly very large) quote file for one personality.
+An empty personality is loaded with COPY / executemany; one that already has
+quotes is synchronised incrementally so existing votes and stats are kept.
+
+Usage: python import_quotes.py <personality_file_name> <path> [--name "Display Name"]
+"""
+import sys
+import time
+import argparse
+import logging
+from sqlalchemy.orm import sessionmaker
+from models import Personality, Quote, Stats
+from migrations import upgrade
+from database import get_engine, get_writer
+from quote_sync import read_quote_file, bulk_insert_quotes, sync_personality
+from response_cache import QUOTES
+from config import PERSONALITIES, QUOTE_IMPORT_CHUNK_SIZE
+import data_versions
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+
+def import_file(session, file_name, path, name=None, chunk_size=QUOTE_IMPORT_CHUNK_SIZE):
+    """Import a quote file and return (rows written, seconds taken)"""
+    personality = session.query(Personality).filter_by(file_name=file_name).first()
+    if not personality:
+        personality = Personality(name=name or PERSONALITIES.get(file_name, file_name), file_name=file_name)
+        session.add(personality)
+        session.flush()
+        session.add(Stats(personality_id=personality.id))
+
+    started = time.perf_counter()
+    connection = session.connection()
+    if session.query(Quote.id).filter_by(personality_id=personality.id).first() is None:
+        written = bulk_insert_quotes(connection, personality.id, read_quote_file(path), chunk_size)
+        personality.quotes_count = written
+    else:
+        lines = list(read_quote_file(path))
+        inserted, edited, moved, deleted = sync_personality(connection, personality.id, lines)
+        written = inserted + edited + moved + len(deleted)
+        personality.quotes_count = len(lines)
+        logging.info(f"{inserted} added, {edited} edited, {moved} renumbered, {len(deleted)} removed")
+    # Running bots and web workers reload their corpus when they see the new version
+    data_versions.bump(connection, QUOTES)
+    session.commit()
+    return written, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import a quote file")
+    parser.add_argument('file_name', help="personality key, e.g. wgg")
+    parser.add_argument('path', help="UTF-8 text file with one quote per line")
+    parser.add_argument('--name', help="display name when creating a new personality")
+    parser.add_argument('--chunk-size', type=int, default=QUOTE_IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    upgrade(engine)
+    session = sessionmaker(bind=engine)()
+
+    try:
+        # On SQLite the write queue starts the transaction with BEGIN IMMEDIATE
+        written, elapsed = get_writer(engine).run(
+            import_file, session, args.file_name, args.path, args.name, args.chunk_size)
+        logging.info(f"Imported {written} rows in {elapsed:.2f}s "
+                     f"({written / elapsed if elapsed else 0:.0f} rows/s)")
+    except Exception as e:
+        session.rollback()
+        logging.error(f"Import failed: {e}")
+        sys.exit(1)
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Bounded map from Discord message ids to the quote each message shows.
+Reactions on recent quote messages resolve here without touching the database;
+older messages fall back to the quote_messages table (see QuotesManager.quote_for_message).
+"""
+import threading
+from collections import OrderedDict
+
+
+class MessageQuoteMap:
+    """LRU of message_id -> quote_id, least recently used messages dropped first"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._quotes = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def put(self, message_id, quote_id):
+        with self._lock:
+            self._quotes[message_id] = quote_id
+            self._quotes.move_to_end(message_id)
+            while len(self._quotes) > self.max_entries:
+                self._quotes.popitem(last=False)
+                self.evicted += 1
+
+    def get(self, message_id):
+        """Quote id shown by message_id, or None when the message is not in the map"""
+        with self._lock:
+            quote_id = self._quotes.get(message_id)
+            if quote_id is None:
+                self.misses += 1
+                return None
+            self._quotes.move_to_end(message_id)
+            self.hits += 1
+            return quote_id
+
+    def forget_quotes(self, quote_ids):
+        """Drop messages that show deleted quotes"""
+        quote_ids = set(quote_ids)
+        if not quote_ids:
+            return
+        with self._lock:
+            for message_id in [message_id for message_id, quote_id in self._quotes.items() if quote_id in quote_ids]:
+                del self._quotes[message_id]
+
+    def metrics(self):
+        with self._lock:
+            return {'entries': len(self._quotes), 'hits': self.hits, 'misses': self.misses,
+                    'evicted': self.evicted}
@@ -0,0 +1,156 @@
+"""
+Idempotent schema upgrades for databases created before a model change.
+Base.metadata.create_all only creates missing tables, so constraints and
+indexes added to existing tables are applied here on startup. Both run on the
+engine's write queue, so on SQLite they start with BEGIN IMMEDIATE.
+"""
+import logging
+from sqlalchemy import inspect, text
+from models import Base
+from search_index import normalize
+from quote_sync import content_hash
+import command_rollup
+import data_versions
+from database import get_writer
+
+logger = logging.getLogger(__name__)
+
+
+def _index_names(connection, table):
+    """Names of all indexes on a table, read from the catalog so expression indexes are included"""
+    if connection.dialect.name == 'postgresql':
+        rows = connection.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = :table AND schemaname = current_schema()"),
+            {'table': table})
+    elif connection.dialect.name == 'sqlite':
+        rows = connection.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"), {'table': table})
+    else:
+        inspector = inspect(connection)
+        rows = [(index['name'],) for index in inspector.get_indexes(table)]
+    return {row[0] for row in rows}
+
+
+def _unique_votes(connection):
+    """One vote per (user_id, quote_id), required by the vote upsert"""
+    if 'uq_votes_user_quote' in _index_names(connection, 'votes'):
+        return False
+    # Keep the most recent vote when older code left duplicates behind;
+    # the index itself is created by _model_indexes
+    result = connection.execute(text(
+        "DELETE FROM votes WHERE id NOT IN "
+        "(SELECT MAX(id) FROM votes GROUP BY user_id, quote_id)"))
+    return result.rowcount > 0
+
+
+def _quote_score_column(connection):
+    """Materialize upvotes - downvotes so leaderboards can read an index instead of sorting"""
+    columns = {column['name'] for column in inspect(connection).get_columns('quotes')}
+    if 'score' in columns:
+        return False
+    connection.execute(text("ALTER TABLE quotes ADD COLUMN score INTEGER NOT NULL DEFAULT 0"))
+    connection.execute(text(
+        "UPDATE quotes SET score = COALESCE(upvotes, 0) - COALESCE(downvotes, 0)"))
+    # The score indexes used to be expression indexes; _model_indexes recreates them on the column
+    existing = _index_names(connection, 'quotes')
+    for name in ('ix_quotes_score', 'ix_quotes_personality_score'):
+        if name in existing:
+            connection.execute(text(f"DROP INDEX {name}"))
+    return True
+
+
+def _quote_search_text(connection):
+    """Backfill the normalized search text used by the full-text index"""
+    columns = {column['name'] for column in inspect(connection).get_columns('quotes')}
+    if 'search_text' not in columns:
+        connection.execute(text("ALTER TABLE quotes ADD COLUMN search_text VARCHAR(1000)"))
+    rows = connection.execute(text("SELECT id, content FROM quotes WHERE search_text IS NULL")).all()
+    if rows:
+        connection.execute(text("UPDATE quotes SET search_text = :search_text WHERE id = :id"),
+                           [{'id': quote_id, 'search_text': normalize(content)} for quote_id, content in rows])
+    return bool(rows) or 'search_text' not in columns
+
+
+def _quote_content_hash(connection):
+    """Backfill the content digest used by the incremental reload"""
+    columns = {column['name'] for column in inspect(connection).get_columns('quotes')}
+    if 'content_hash' not in columns:
+        connection.execute(text("ALTER TABLE quotes ADD COLUMN content_hash VARCHAR(32)"))
+    rows = connection.execute(text("SELECT id, content FROM quotes WHERE content_hash IS NULL")).all()
+    if rows:
+        connection.execute(text("UPDATE quotes SET content_hash = :content_hash WHERE id = :id"),
+                           [{'id': quote_id, 'content_hash': content_hash(content)} for quote_id, content in rows])
+    return bool(rows) or 'content_hash' not in columns
+
+
+def _quote_search_vector(connection):
+    """Postgres only: generated tsvector column over search_text with a GIN index"""
+    if connection.dialect.name != 'postgresql':
+        return False
+    columns = {column['name'] for column in inspect(connection).get_columns('quotes')}
+    if 'search_vector' in columns:
+        return False
+    connection.execute(text(
+        "ALTER TABLE quotes ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(search_text, ''))) STORED"))
+    connection.execute(text("CREATE INDEX ix_quotes_search_vector ON quotes USING gin (search_vector)"))
+    return True
+
+
+def _command_usage_rollup(connection):
+    """Backfill the hourly command usage rollup from the raw command log"""
+    if connection.execute(text("SELECT 1 FROM command_usage LIMIT 1")).first() is not None:
+        return False
+    return command_rollup.rebuild(connection) > 0
+
+
+def _data_version_rows(connection):
+    """Seed a data_versions row per tracked name so bumps are plain UPDATEs"""
+    return data_versions.seed(connection)
+
+
+def _model_indexes(connection):
+    """Create every index declared in models.py that the database is missing"""
+    created = False
+    for table in Base.metadata.sorted_tables:
+        existing = _index_names(connection, table.name)
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name in existing:
+                continue
+            if index.unique and _has_duplicates(connection, index):
+                logger.warning(f"Skipping unique index {index.name}: existing rows are not unique")
+                continue
+            index.create(connection)
+            created = True
+    return created
+
+
+def _has_duplicates(connection, index):
+    columns = ', '.join(column.name for column in index.columns)
+    return connection.execute(text(
+        f"SELECT 1 FROM {index.table.name} GROUP BY {columns} HAVING COUNT(*) > 1 LIMIT 1")).first() is not None
+
+
+MIGRATIONS = [
+    _unique_votes,
+    _quote_score_column,
+    _quote_search_text,
+    _quote_content_hash,
+    _quote_search_vector,
+    _command_usage_rollup,
+    _data_version_rows,
+    _model_indexes,
+]
+
+
+def upgrade(engine):
+    """Create missing tables and apply every pending migration in one transaction"""
+    get_writer(engine).run(_upgrade, engine)
+
+
+def _upgrade(engine):
+    with engine.begin() as connection:
+        Base.metadata.create_all(connection)
+        for migration in MIGRATIONS:
+            if migration(connection):
+                logger.info(f"Applied migration {migration.__name__}")
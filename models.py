@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -7,6 +7,9 @@ Base = declarative_base()
 
 class Personality(Base):
     __tablename__ = 'personalities'
+    __table_args__ = (
+        Index('uq_personalities_file_name', 'file_name', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     name = Column(String(50), nullable=False)
@@ -25,23 +28,34 @@ class Quote(Base):
     personality_id = Column(Integer, ForeignKey('personalities.id'), nullable=False)
     number = Column(Integer, nullable=False)  # Quote number in the original file
     content = Column(String(1000), nullable=False)
+    search_text = Column(String(1000), nullable=True)  # content lowercased with diacritics stripped
+    content_hash = Column(String(32), nullable=True)  # digest of content, used to diff quote files on reload
     upvotes = Column(Integer, default=0)
     downvotes = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_used = Column(DateTime, nullable=True)
     use_count = Column(Integer, default=0)
+    score = Column(Integer, default=0, nullable=False)  # upvotes - downvotes, kept in sync by the vote path
     
     personality = relationship("Personality", back_populates="quotes")
     
-    @property
-    def score(self):
-        return self.upvotes - self.downvotes
-    
     def __repr__(self):
-        return f"<Quote {self.personality.name} #{self.number}>"
+        # Only use a personality that is already loaded; repr must not lazy load on a detached quote
+        personality = self.__dict__.get('personality')
+        return f"<Quote {personality.name if personality else self.personality_id} #{self.number}>"
+
+# Quote indexes reference column expressions, so they are declared once the class exists
+Index('uq_quotes_personality_number', Quote.personality_id, Quote.number, unique=True)
+Index('ix_quotes_score', Quote.score.desc())
+Index('ix_quotes_personality_score', Quote.personality_id, Quote.score.desc())
+Index('ix_quotes_last_used', Quote.last_used.desc())
 
 class Command(Base):
     __tablename__ = 'commands'
+    __table_args__ = (
+        Index('ix_commands_timestamp', 'timestamp'),
+        Index('ix_commands_command', 'command'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(String(50), nullable=False)
@@ -52,8 +66,42 @@ class Command(Base):
     def __repr__(self):
         return f"<Command {self.command} by {self.user_id} at {self.timestamp}>"
 
+class QuoteMessage(Base):
+    """Discord message that shows a quote, so reactions on it can be routed to the quote"""
+    __tablename__ = 'quote_messages'
+    __table_args__ = (
+        Index('ix_quote_messages_created_at', 'created_at'),
+    )
+    
+    message_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    quote_id = Column(Integer, ForeignKey('quotes.id'), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<QuoteMessage {self.message_id} for quote {self.quote_id}>"
+
+class CommandUsage(Base):
+    """Hourly command counts per personality, maintained as commands are recorded"""
+    __tablename__ = 'command_usage'
+    __table_args__ = (
+        Index('uq_command_usage_bucket', 'hour', 'command', 'personality_id', unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    hour = Column(DateTime, nullable=False)  # start of the UTC hour
+    command = Column(String(50), nullable=False)
+    personality_id = Column(Integer, nullable=False, default=0)  # 0 when the command returned no quote
+    count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<CommandUsage {self.command} x{self.count} at {self.hour}>"
+
 class Vote(Base):
     __tablename__ = 'votes'
+    __table_args__ = (
+        Index('uq_votes_user_quote', 'user_id', 'quote_id', unique=True),
+        Index('ix_votes_quote_id', 'quote_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(String(50), nullable=False)
@@ -64,8 +112,21 @@ class Vote(Base):
     def __repr__(self):
         return f"<Vote {self.vote} by {self.user_id} for quote {self.quote_id}>"
 
+class DataVersion(Base):
+    """Counter bumped when quotes or votes change, so other processes know to reload"""
+    __tablename__ = 'data_versions'
+    
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<DataVersion {self.name} {self.version}>"
+
 class Stats(Base):
     __tablename__ = 'stats'
+    __table_args__ = (
+        Index('uq_stats_personality_id', 'personality_id', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     personality_id = Column(Integer, ForeignKey('personalities.id'), nullable=False)
@@ -77,4 +138,5 @@ class Stats(Base):
     personality = relationship("Personality")
     
     def __repr__(self):
-        return f"<Stats for {self.personality.name}>"
+        personality = self.__dict__.get('personality')
+        return f"<Stats for {personality.name if personality else self.personality_id}>"
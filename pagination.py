@@ -0,0 +1,51 @@
+"""
+Keyset (cursor) pagination.
+A page is fetched with WHERE (key columns) > cursor ORDER BY key LIMIT n, which reads the
+same number of index entries on page 1000 as on page 1. Cursors are opaque to clients.
+"""
+import base64
+import json
+from sqlalchemy import tuple_
+
+
+def encode_cursor(key):
+    """Opaque, URL-safe token for a tuple of key values"""
+    return base64.urlsafe_b64encode(json.dumps(list(key), separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Key tuple from a token made by encode_cursor; raises ValueError if it is malformed"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(key, list) or len(key) != size or not all(isinstance(value, int) for value in key):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return tuple(key)
+
+
+def keyset_page(query, columns, limit, after=None, before=None):
+    """Fetch one page of query ordered by columns
+
+    Returns (rows, previous_cursor, next_cursor); a cursor is None when there is nothing
+    in that direction. `after` and `before` are cursors from an earlier page.
+    """
+    key = tuple_(*columns)
+    if before is not None:
+        rows = query.filter(key < decode_cursor(before, len(columns))).\
+            order_by(*(column.desc() for column in columns)).limit(limit + 1).all()
+        has_previous, has_next = len(rows) > limit, True
+        rows = rows[:limit][::-1]
+    else:
+        if after is not None:
+            query = query.filter(key > decode_cursor(after, len(columns)))
+        rows = query.order_by(*columns).limit(limit + 1).all()
+        has_previous, has_next = after is not None, len(rows) > limit
+        rows = rows[:limit]
+
+    def cursor_for(row):
+        return encode_cursor(getattr(row, column.key) for column in columns)
+
+    previous_cursor = cursor_for(rows[0]) if rows and has_previous else None
+    next_cursor = cursor_for(rows[-1]) if rows and has_next else None
+    return rows, previous_cursor, next_cursor
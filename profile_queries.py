@@ -0,0 +1,118 @@
+"""
+Zulte Kroniki Query Profiler
+Counts the SQL statements issued by each dashboard route, API endpoint and bot command
+at a small and a large page size, on a scratch SQLite database loaded from the quote
+files. Exits with status 1 when a fixed check issues more statements than its budget
+or a count grows with the page size (an N+1 query).
+
+Usage: python profile_queries.py [--small N] [--large N] [--database PATH]
+"""
+import os
+import sys
+import argparse
+import tempfile
+from collections import Counter
+from sqlalchemy import event
+
+
+def count_statements(engine, fn):
+    """Number of statements sent to the database while fn runs"""
+    statements = []
+
+    def record(connection, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        fn()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return len(statements)
+
+
+def search_terms(manager, small, large):
+    """A search term matching at most `small` quotes and one matching at least `large`"""
+    words = Counter(word for _, _, content in manager.corpus.documents() for word in set(content.lower().split())
+                    if word.isalpha() and len(word) > 3)
+    rare = next((word for word, count in words.items() if 0 < count <= small), None)
+    common = next((word for word, count in words.most_common() if count >= large), None)
+    return rare, common
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count SQL statements per route and command")
+    parser.add_argument('--small', type=int, default=2)
+    parser.add_argument('--large', type=int, default=20)
+    parser.add_argument('--database', help="SQLite file to use (default: a new temporary file)")
+    args = parser.parse_args()
+
+    path = args.database or os.path.join(tempfile.mkdtemp(), 'profile.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.abspath(path)}"
+    os.environ.setdefault('RESPONSE_CACHE_BACKEND', 'memory')
+    # Keep the periodic cross-process change check out of the per-request counts
+    os.environ.setdefault('CHANGE_CHECK_INTERVAL', '3600')
+    from app import app, engine, quotes_manager  # noqa: E402 - reads DATABASE_URL at import
+    from embeds import quote_embed, quote_title, quote_preview
+
+    client = app.test_client()
+    requests_made = Counter()
+
+    def get(url):
+        # A fresh query string per request keeps the response cache out of the measurement
+        requests_made[url] += 1
+        response = client.get(f"{url}{'&' if '?' in url else '?'}profile={requests_made[url]}")
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+
+    personalities = quotes_manager.corpus.personalities
+    rare, common = search_terms(quotes_manager, args.small, args.large)
+    quote = quotes_manager.corpus.random()
+
+    # {check: (statement budget, fn)}
+    fixed = {
+        'GET /': (6, lambda: get('/')),
+        'GET /stats': (5, lambda: get('/stats')),
+        'GET /api/stats': (4, lambda: get('/api/stats')),
+        'bot /stats': (3, quotes_manager.get_statistics),
+        'bot /random': (0, lambda: quote_embed(quotes_manager.get_random_quote(), personalities)),
+        'bot vote': (3, lambda: quotes_manager.record_vote('profile', quote.id, 1)),
+        'bot reaction lookup': (2, lambda: quotes_manager.quote_for_message(1, f"{quote_title(quote, personalities)}")),
+    }
+    sized = {
+        'GET /api/quotes?limit=N': lambda n: get(f'/api/quotes?limit={n}'),
+        'GET /api/quotes/random?count=N': lambda n: get(f'/api/quotes/random?count={n}'),
+        'bot /top N': lambda n: [(quote_title(q, personalities), quote_preview(q))
+                                 for q in quotes_manager.get_top_quotes(n)],
+    }
+    if rare and common:
+        sized['GET /quotes?search= (page of N)'] = lambda n: get(f"/quotes?search={rare if n == args.small else common}")
+        sized['bot /szukaj N'] = lambda n: [(quote_title(q, personalities), quote_preview(q)) for q in
+                                            quotes_manager.search_quotes_page(common, limit=n)[1]]
+
+    print(f"{'check':<36} {'statements':>10} {'budget':>7}")
+    over_budget = []
+    for name, (budget, fn) in fixed.items():
+        count = count_statements(engine, fn)
+        print(f"{name:<36} {count:>10} {budget:>7}")
+        if count > budget:
+            over_budget.append(name)
+
+    failures = []
+    for name, fn in sized.items():
+        small = count_statements(engine, lambda: fn(args.small))
+        large = count_statements(engine, lambda: fn(args.large))
+        print(f"{name:<36} {small:>5} /{large:>4}  (N={args.small} / N={args.large})")
+        if large > small:
+            failures.append(name)
+
+    quotes_manager.close()
+    if over_budget:
+        print(f"Statement budget exceeded: {', '.join(over_budget)}")
+    if failures:
+        print(f"Statement count grows with page size: {', '.join(failures)}")
+    if over_budget or failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import heapq
+import random
+import threading
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from models import Personality, Quote
+
+# Lightweight stand-in for the Personality relationship so callers can keep using quote.personality.name
+PersonalityInfo = namedtuple('PersonalityInfo', ['id', 'name', 'file_name'])
+
+
+class CachedQuote:
+    """Detached snapshot of a quote served from the in-memory corpus"""
+    __slots__ = ('id', 'personality_id', 'number', 'content', 'upvotes', 'downvotes', 'use_count', 'personality')
+
+    def __init__(self, id, personality, number, content, upvotes, downvotes, use_count):
+        self.id = id
+        self.personality_id = personality.id
+        self.personality = personality
+        self.number = number
+        self.content = content
+        self.upvotes = upvotes
+        self.downvotes = downvotes
+        self.use_count = use_count
+
+    @property
+    def score(self):
+        return self.upvotes - self.downvotes
+
+    def __repr__(self):
+        return f"<CachedQuote {self.personality.name} #{self.number}>"
+
+
+class PersonalityQuotes:
+    """Column-oriented quote arrays for a single personality"""
+    __slots__ = ('personality', 'ids', 'numbers', 'contents', 'upvotes', 'downvotes', 'use_count', 'index_by_number')
+
+    def __init__(self, personality):
+        self.personality = personality
+        self.ids = array('q')
+        self.numbers = array('l')
+        self.contents = []
+        self.upvotes = array('l')
+        self.downvotes = array('l')
+        self.use_count = array('l')
+        self.index_by_number = {}
+
+    def append(self, quote_id, number, content, upvotes, downvotes, use_count):
+        self.index_by_number[number] = len(self.ids)
+        self.ids.append(quote_id)
+        self.numbers.append(number)
+        self.contents.append(content)
+        self.upvotes.append(upvotes or 0)
+        self.downvotes.append(downvotes or 0)
+        self.use_count.append(use_count or 0)
+
+    def snapshot(self, index):
+        return CachedQuote(
+            self.ids[index],
+            self.personality,
+            self.numbers[index],
+            self.contents[index],
+            self.upvotes[index],
+            self.downvotes[index],
+            self.use_count[index]
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class ScoreHeap:
+    """Incrementally maintained max-heap of quote scores for top-N queries
+
+    Score changes push a fresh entry and leave the old one behind; stale entries are
+    skipped when reading and dropped when the heap is compacted.
+    """
+
+    def __init__(self, scores=None):
+        self._lock = threading.Lock()
+        self._scores = dict(scores or {})  # {quote_id: current score}
+        self._rebuild()
+
+    def _rebuild(self):
+        self._heap = [(-score, quote_id) for quote_id, score in self._scores.items()]
+        heapq.heapify(self._heap)
+
+    def update(self, quote_id, score):
+        with self._lock:
+            if self._scores.get(quote_id) == score:
+                return
+            self._scores[quote_id] = score
+            heapq.heappush(self._heap, (-score, quote_id))
+            if len(self._heap) > 2 * len(self._scores) + 64:
+                self._rebuild()
+
+    def top(self, limit):
+        """Return up to `limit` quote ids, highest score first (ties by lowest id)"""
+        with self._lock:
+            taken, seen = [], set()
+            while self._heap and len(taken) < limit:
+                entry = heapq.heappop(self._heap)
+                neg_score, quote_id = entry
+                if quote_id in seen or self._scores.get(quote_id) != -neg_score:
+                    continue  # stale or duplicate entry, drop it for good
+                seen.add(quote_id)
+                taken.append(entry)
+            for entry in taken:
+                heapq.heappush(self._heap, entry)
+            return [quote_id for _, quote_id in taken]
+
+
+class QuoteCorpus:
+    """Resident, read-mostly copy of the quotes table for O(1) random and numbered lookups"""
+
+    def __init__(self):
+        self.by_file_name = {}  # {file_name: PersonalityQuotes}
+        self.personalities = {}  # {personality_id: PersonalityInfo}
+        self.locations = {}  # {quote_id: (PersonalityQuotes, index)}
+        self._buckets = []  # non-empty buckets, in the same order as _offsets
+        self._offsets = []  # cumulative quote counts used to map a global index to a bucket
+        self.top_scores = ScoreHeap()  # across all personalities
+        self.top_scores_by_file_name = {}  # {file_name: ScoreHeap}
+
+    @classmethod
+    def load(cls, session):
+        """Build the corpus with one column-only query per table (no ORM hydration)"""
+        corpus = cls()
+        buckets_by_id = {}
+
+        for personality_id, name, file_name in session.query(
+                Personality.id, Personality.name, Personality.file_name).order_by(Personality.id):
+            bucket = PersonalityQuotes(PersonalityInfo(personality_id, name, file_name))
+            corpus.by_file_name[file_name] = bucket
+            corpus.personalities[personality_id] = bucket.personality
+            buckets_by_id[personality_id] = bucket
+
+        rows = session.query(
+            Quote.id, Quote.personality_id, Quote.number, Quote.content,
+            Quote.upvotes, Quote.downvotes, Quote.use_count
+        ).order_by(Quote.personality_id, Quote.number)
+
+        for quote_id, personality_id, number, content, upvotes, downvotes, use_count in rows:
+            bucket = buckets_by_id.get(personality_id)
+            if bucket is None:
+                continue
+            corpus.locations[quote_id] = (bucket, len(bucket))
+            bucket.append(quote_id, number, content, upvotes, downvotes, use_count)
+
+        total = 0
+        all_scores = {}
+        for file_name, bucket in corpus.by_file_name.items():
+            scores = {bucket.ids[i]: bucket.upvotes[i] - bucket.downvotes[i] for i in range(len(bucket))}
+            corpus.top_scores_by_file_name[file_name] = ScoreHeap(scores)
+            all_scores.update(scores)
+            if len(bucket):
+                total += len(bucket)
+                corpus._buckets.append(bucket)
+                corpus._offsets.append(total)
+        corpus.top_scores = ScoreHeap(all_scores)
+
+        return corpus
+
+    def __len__(self):
+        return self._offsets[-1] if self._offsets else 0
+
+    def count(self, personality_file_name=None):
+        """Number of quotes, optionally for a single personality (0 if it is unknown)"""
+        if personality_file_name:
+            bucket = self.by_file_name.get(personality_file_name)
+            return len(bucket) if bucket else 0
+        return len(self)
+
+    def documents(self):
+        """Yield (quote_id, personality_id, content) for every quote, e.g. to build a search index"""
+        for bucket in self.by_file_name.values():
+            personality_id = bucket.personality.id
+            for quote_id, content in zip(bucket.ids, bucket.contents):
+                yield quote_id, personality_id, content
+
+    def personality(self, file_name):
+        """Return the PersonalityInfo for a file name, or None"""
+        bucket = self.by_file_name.get(file_name)
+        return bucket.personality if bucket else None
+
+    def random(self, personality_file_name=None):
+        """Pick a uniformly random quote, optionally from a single personality"""
+        if personality_file_name:
+            bucket = self.by_file_name.get(personality_file_name)
+            if not bucket or not len(bucket):
+                return None
+            return bucket.snapshot(random.randrange(len(bucket)))
+
+        total = len(self)
+        return self._at(random.randrange(total)) if total else None
+
+    def sample(self, count, personality_file_name=None):
+        """Pick up to `count` distinct random quotes; cost depends on count, not on corpus size"""
+        if personality_file_name:
+            bucket = self.by_file_name.get(personality_file_name)
+            if not bucket:
+                return []
+            return [bucket.snapshot(index) for index in random.sample(range(len(bucket)), min(count, len(bucket)))]
+
+        total = len(self)
+        return [self._at(position) for position in random.sample(range(total), min(count, total))]
+
+    def _at(self, position):
+        """Quote at a global position, mapping it to a personality bucket by its offset"""
+        slot = bisect_right(self._offsets, position)
+        start = self._offsets[slot - 1] if slot else 0
+        return self._buckets[slot].snapshot(position - start)
+
+    def get(self, personality_file_name, number):
+        """Look up a quote by personality and its number in the source file"""
+        bucket = self.by_file_name.get(personality_file_name)
+        if not bucket:
+            return None
+        index = bucket.index_by_number.get(number)
+        return bucket.snapshot(index) if index is not None else None
+
+    def get_by_id(self, quote_id):
+        """Look up a quote by primary key"""
+        location = self.locations.get(quote_id)
+        if not location:
+            return None
+        bucket, index = location
+        return bucket.snapshot(index)
+
+    def record_use(self, quote_id, count=1):
+        """Bump the resident use counter so snapshots stay in step with the database"""
+        location = self.locations.get(quote_id)
+        if location:
+            bucket, index = location
+            bucket.use_count[index] += count
+
+    def apply_vote(self, quote_id, upvotes_delta, downvotes_delta):
+        """Apply vote deltas to the resident counters"""
+        location = self.locations.get(quote_id)
+        if location:
+            bucket, index = location
+            bucket.upvotes[index] += upvotes_delta
+            bucket.downvotes[index] += downvotes_delta
+            score = bucket.upvotes[index] - bucket.downvotes[index]
+            self.top_scores.update(quote_id, score)
+            self.top_scores_by_file_name[bucket.personality.file_name].update(quote_id, score)
+
+    def set_votes(self, rows):
+        """Replace resident vote counters from (quote_id, upvotes, downvotes) rows
+
+        Returns the ids of the quotes whose counters changed.
+        """
+        changed = []
+        for quote_id, upvotes, downvotes in rows:
+            location = self.locations.get(quote_id)
+            if not location:
+                continue
+            bucket, index = location
+            if bucket.upvotes[index] == upvotes and bucket.downvotes[index] == downvotes:
+                continue
+            bucket.upvotes[index] = upvotes
+            bucket.downvotes[index] = downvotes
+            score = upvotes - downvotes
+            self.top_scores.update(quote_id, score)
+            self.top_scores_by_file_name[bucket.personality.file_name].update(quote_id, score)
+            changed.append(quote_id)
+        return changed
+
+    def top(self, limit, personality_file_name=None):
+        """Highest scoring quotes, optionally for a single personality"""
+        if personality_file_name:
+            heap = self.top_scores_by_file_name.get(personality_file_name)
+            if heap is None:
+                return []
+        else:
+            heap = self.top_scores
+        return [self.get_by_id(quote_id) for quote_id in heap.top(limit)]
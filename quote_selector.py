@@ -0,0 +1,184 @@
+"""
+Weighted random quote selection.
+Each quote's weight combines its score and whether it was used recently. Weights live in
+Fenwick trees (one per personality), so a pick and a weight change both cost O(log n),
+and channels remember their last picks to avoid showing the same quote twice in a row.
+"""
+import heapq
+import math
+import random
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+
+MAX_ATTEMPTS = 8  # re-draws when a pick is in the channel history before accepting a repeat
+MAX_CHANNELS = 10000  # channel histories kept, least recently active dropped first
+
+
+class FenwickTree:
+    """Binary indexed tree of non-negative float weights with weighted sampling"""
+
+    def __init__(self, weights):
+        self.weights = array('d', weights)
+        self._rebuild()
+
+    def _rebuild(self):
+        size = len(self.weights)
+        tree = array('d', [0.0]) * (size + 1)
+        for index, weight in enumerate(self.weights, 1):
+            tree[index] += weight
+            parent = index + (index & -index)
+            if parent <= size:
+                tree[parent] += tree[index]
+        self._tree = tree
+        self._updates = 0
+        self._step = 1 << (size.bit_length() - 1) if size else 0
+
+    def __len__(self):
+        return len(self.weights)
+
+    @property
+    def total(self):
+        total, index = 0.0, len(self.weights)
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def set(self, position, weight):
+        delta = weight - self.weights[position]
+        if not delta:
+            return
+        self.weights[position] = weight
+        index = position + 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+        # Float deltas accumulate rounding error; rebuild once every position could have changed
+        self._updates += 1
+        if self._updates > len(self.weights):
+            self._rebuild()
+
+    def find(self, target):
+        """Position whose cumulative weight range contains target (0 <= target < total)"""
+        position, step = 0, self._step
+        while step:
+            following = position + step
+            if following < len(self._tree) and self._tree[following] <= target:
+                position = following
+                target -= self._tree[following]
+            step >>= 1
+        return min(position, len(self.weights) - 1)
+
+
+class QuoteSelector:
+    """Score- and recency-weighted picks over a QuoteCorpus that avoid per-channel repeats"""
+
+    def __init__(self, corpus, score_weight, recent_penalty, recent_window, channel_history):
+        self.corpus = corpus
+        self.score_weight = score_weight
+        self.recent_penalty = recent_penalty
+        self.recent_window = recent_window
+        self.channel_history = channel_history
+        self.channels = OrderedDict()  # {channel_id: deque of recently shown quote ids}
+        self._trees = {}  # {file_name: FenwickTree over that personality's corpus positions}
+        self._recent = {}  # {quote_id: time its recency penalty ends}
+        self._recovery = []  # min-heap of (time the penalty ends, quote_id)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, corpus, recently_used, score_weight, recent_penalty, recent_window, channel_history,
+              channels=None):
+        """Build weights for every quote in corpus
+
+        recently_used maps quote ids to the epoch time of their last use inside the recent
+        window; channels carries the histories over from a previous selector.
+        """
+        selector = cls(corpus, score_weight, recent_penalty, recent_window, channel_history)
+        if channels:
+            selector.channels = channels
+        now = time.time()
+        for quote_id, last_used in recently_used.items():
+            if last_used + recent_window > now:
+                selector._recent[quote_id] = last_used + recent_window
+                selector._recovery.append((last_used + recent_window, quote_id))
+        heapq.heapify(selector._recovery)
+
+        for file_name, bucket in corpus.by_file_name.items():
+            selector._trees[file_name] = FenwickTree(
+                selector._weight(bucket.ids[index], bucket.upvotes[index] - bucket.downvotes[index])
+                for index in range(len(bucket)))
+        return selector
+
+    def _weight(self, quote_id, score):
+        # Scores are clamped so a runaway vote count cannot drown out the rest of the pool
+        weight = math.exp(self.score_weight * max(-20, min(20, score)))
+        if quote_id in self._recent:
+            weight *= self.recent_penalty
+        return weight
+
+    def _refresh(self, quote_id):
+        location = self.corpus.locations.get(quote_id)
+        if location:
+            bucket, index = location
+            self._trees[bucket.personality.file_name].set(
+                index, self._weight(quote_id, bucket.upvotes[index] - bucket.downvotes[index]))
+
+    def _recover(self, now):
+        """Lift recency penalties that have run out"""
+        while self._recovery and self._recovery[0][0] <= now:
+            ends_at, quote_id = heapq.heappop(self._recovery)
+            if self._recent.get(quote_id) == ends_at:
+                del self._recent[quote_id]
+                self._refresh(quote_id)
+
+    def score_changed(self, quote_id):
+        """Re-weight a quote after its votes changed in the corpus"""
+        with self._lock:
+            self._refresh(quote_id)
+
+    def mark_used(self, quote_id, channel_id=None):
+        """Penalize a quote that was just shown and remember it for the channel"""
+        with self._lock:
+            ends_at = time.time() + self.recent_window
+            self._recent[quote_id] = ends_at
+            heapq.heappush(self._recovery, (ends_at, quote_id))
+            self._refresh(quote_id)
+            if channel_id is not None and self.channel_history:
+                history = self.channels.get(channel_id)
+                if history is None:
+                    history = self.channels[channel_id] = deque(maxlen=self.channel_history)
+                    while len(self.channels) > MAX_CHANNELS:
+                        self.channels.popitem(last=False)
+                else:
+                    self.channels.move_to_end(channel_id)
+                history.append(quote_id)
+
+    def pick(self, personality_file_name=None, channel_id=None):
+        """Draw a quote by weight, re-drawing picks the channel has seen recently"""
+        with self._lock:
+            self._recover(time.time())
+            if personality_file_name:
+                tree = self._trees.get(personality_file_name)
+                pools = [(personality_file_name, tree)] if tree is not None and len(tree) else []
+            else:
+                pools = [(file_name, tree) for file_name, tree in self._trees.items() if len(tree)]
+            if not pools:
+                return None
+
+            totals = [tree.total for _, tree in pools]
+            if not sum(totals):
+                return self.corpus.random(personality_file_name)
+            seen = self.channels.get(channel_id, ())
+            for _ in range(MAX_ATTEMPTS):
+                target = random.random() * sum(totals)
+                for (file_name, tree), total in zip(pools, totals):
+                    if target < total or tree is pools[-1][1]:
+                        break
+                    target -= total
+                bucket = self.corpus.by_file_name[file_name]
+                index = tree.find(min(target, total))
+                if bucket.ids[index] not in seen:
+                    break
+            return bucket.snapshot(index)
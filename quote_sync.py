@@ -0,0 +1,186 @@
+"""
+Bulk loading and incremental synchronisation of quote files with the quotes table.
+On sync, lines are matched to existing rows by content hash, so a quote keeps its id,
+votes and usage statistics when it is moved or other lines change around it.
+"""
+import io
+import hashlib
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import select, insert, update, delete, bindparam, func, case
+from models import Quote, Vote, Command, QuoteMessage, Stats
+from search_index import normalize
+
+CHUNK_SIZE = 500  # ids per IN (...) list, below every backend's parameter limit
+COPY_COLUMNS = ('personality_id', 'number', 'content', 'search_text', 'content_hash',
+                'upvotes', 'downvotes', 'use_count', 'score', 'created_at')
+
+
+def content_hash(content):
+    """Stable 128-bit hex digest of a quote's text"""
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def read_quote_file(file_path):
+    """Yield (number, content) for each quote line; the line number is the quote number"""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if line and not line.startswith('#'):  # Skip empty lines and comments
+                yield number, line
+
+
+def quote_row(personality_id, number, content):
+    """Column values for a new quote row"""
+    return {
+        'personality_id': personality_id,
+        'number': number,
+        'content': content,
+        'search_text': normalize(content),
+        'content_hash': content_hash(content)
+    }
+
+
+def _copy_field(value):
+    """Escape a value for Postgres COPY text format"""
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _copy_rows(connection, rows):
+    """Stream rows into quotes with COPY FROM STDIN (psycopg2)"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_field(row[column]) for column in COPY_COLUMNS))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY quotes ({', '.join(COPY_COLUMNS)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+
+def bulk_insert_quotes(connection, personality_id, lines, chunk_size):
+    """Insert (number, content) lines in chunks and return how many rows were written
+
+    Uses COPY on Postgres and executemany INSERTs elsewhere. Runs inside the caller's
+    transaction; the lines iterable is consumed lazily so files of any size stream through.
+    """
+    use_copy = connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2'
+    now = datetime.utcnow()
+    lines = iter(lines)
+    imported = 0
+    while True:
+        chunk = [quote_row(personality_id, number, content) for number, content in islice(lines, chunk_size)]
+        if not chunk:
+            return imported
+        for row in chunk:
+            row.update(upvotes=0, downvotes=0, use_count=0, score=0, created_at=now)
+        if use_copy:
+            _copy_rows(connection, chunk)
+        else:
+            connection.execute(insert(Quote.__table__), chunk)
+        imported += len(chunk)
+
+
+def _chunks(items):
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+def diff_quotes(existing, lines):
+    """Compare existing (id, number, content_hash) rows with (number, content) lines
+
+    Returns (inserts, moves, updates, deletes): lines with no matching row, (quote_id,
+    new_number) for rows whose text moved to another line, (quote_id, content) for rows
+    whose line kept its number but changed its text (e.g. a typo fix), and ids of rows
+    no longer in the file.
+    """
+    rows_by_hash = defaultdict(list)
+    for row in sorted(existing, key=lambda row: row.number):
+        rows_by_hash[row.content_hash].append(row)
+
+    lines_by_hash = defaultdict(list)
+    for number, content in lines:
+        lines_by_hash[content_hash(content)].append((number, content))
+
+    unmatched_lines, unmatched_rows, moves = [], [], []
+    for digest, entries in lines_by_hash.items():
+        rows = rows_by_hash.pop(digest, [])
+        for position, (number, content) in enumerate(entries):
+            if position < len(rows):
+                if rows[position].number != number:
+                    moves.append((rows[position].id, number))
+            else:
+                unmatched_lines.append((number, content))
+        unmatched_rows.extend(rows[len(entries):])
+    for rows in rows_by_hash.values():
+        unmatched_rows.extend(rows)
+
+    # A changed line that still has its old number is an edit of that row, so the quote
+    # keeps its id, votes and usage; no matched row can be moving onto that number
+    rows_by_number = {row.number: row for row in unmatched_rows}
+    inserts, updates = [], []
+    for number, content in unmatched_lines:
+        row = rows_by_number.pop(number, None)
+        if row is not None:
+            updates.append((row.id, content))
+        else:
+            inserts.append((number, content))
+    deletes = [row.id for row in rows_by_number.values()]
+    return inserts, moves, updates, deletes
+
+
+def sync_personality(connection, personality_id, lines):
+    """Apply the difference between a quote file and the table with bulk statements
+
+    Returns (inserted, updated, moved, deleted_ids). Runs inside the caller's transaction.
+    """
+    quotes = Quote.__table__
+    existing = connection.execute(
+        select(quotes.c.id, quotes.c.number, quotes.c.content_hash)
+        .where(quotes.c.personality_id == personality_id)).all()
+    inserts, moves, updates, deletes = diff_quotes(existing, lines)
+
+    votes = Vote.__table__
+    stats = Stats.__table__
+    for ids in _chunks(deletes):
+        # Votes and message links belong to the removed quote; the command log keeps the row without the link.
+        # The personality's vote totals lose the deleted votes too.
+        upvotes, downvotes = connection.execute(
+            select(func.coalesce(func.sum(case((votes.c.vote > 0, 1), else_=0)), 0),
+                   func.coalesce(func.sum(case((votes.c.vote < 0, 1), else_=0)), 0))
+            .where(votes.c.quote_id.in_(ids))).one()
+        if upvotes or downvotes:
+            connection.execute(update(stats).where(stats.c.personality_id == personality_id).values(
+                total_upvotes=stats.c.total_upvotes - upvotes,
+                total_downvotes=stats.c.total_downvotes - downvotes))
+        connection.execute(delete(votes).where(votes.c.quote_id.in_(ids)))
+        connection.execute(delete(QuoteMessage.__table__).where(QuoteMessage.__table__.c.quote_id.in_(ids)))
+        connection.execute(update(Command.__table__).where(Command.__table__.c.quote_id.in_(ids))
+                           .values(quote_id=None))
+        connection.execute(delete(quotes).where(quotes.c.id.in_(ids)))
+
+    if moves:
+        # Park moved rows on unique negative numbers first so renumbering never
+        # collides with the (personality_id, number) unique index
+        renumber = update(quotes).where(quotes.c.id == bindparam('b_id')).values(number=bindparam('b_number'))
+        connection.execute(renumber, [{'b_id': quote_id, 'b_number': -quote_id} for quote_id, _ in moves])
+        connection.execute(renumber, [{'b_id': quote_id, 'b_number': number} for quote_id, number in moves])
+
+    if updates:
+        edit = update(quotes).where(quotes.c.id == bindparam('b_id')).values(
+            content=bindparam('b_content'), search_text=bindparam('b_search_text'),
+            content_hash=bindparam('b_content_hash'))
+        connection.execute(edit, [{'b_id': quote_id, 'b_content': content, 'b_search_text': normalize(content),
+                                   'b_content_hash': content_hash(content)} for quote_id, content in updates])
+
+    if inserts:
+        connection.execute(insert(quotes), [quote_row(personality_id, number, content)
+                                            for number, content in inserts])
+
+    return len(inserts), len(updates), len(moves), deletes
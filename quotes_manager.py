@@ -1,51 +1,98 @@
 import os
-import random
+import time
+import atexit
+import threading
 import logging
-from datetime import datetime, timedelta
-from sqlalchemy import create_engine, func
-from sqlalchemy.orm import sessionmaker
-from models import Base, Personality, Quote, Command, Vote, Stats
-from config import PERSONALITIES, DATABASE_URL, QUOTES_DIRECTORY, COOLDOWN_TIME, SPECIFIC_QUOTE_COOLDOWN
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, text
+from sqlalchemy.orm import sessionmaker, joinedload
+from models import Personality, Quote, QuoteMessage, Stats
+from quote_corpus import QuoteCorpus
+from quote_selector import QuoteSelector
+from message_map import MessageQuoteMap
+from search_index import SearchIndex, to_tsquery
+from quote_sync import read_quote_file, bulk_insert_quotes, sync_personality
+from write_behind import WriteBehindBuffer
+from votes import upsert_votes
+from migrations import upgrade
+from database import get_engine, get_writer
+from cooldowns import create_cooldown_store
+from response_cache import create_generations, VOTES, COMMANDS, QUOTES
+import stats_service
+import data_versions
+from config import (PERSONALITIES, QUOTES_DIRECTORY, COOLDOWN_TIME, SPECIFIC_QUOTE_COOLDOWN,
+                    USAGE_FLUSH_INTERVAL, USAGE_FLUSH_THRESHOLD, SEARCH_BACKEND, QUOTE_IMPORT_CHUNK_SIZE,
+                    COOLDOWN_BACKEND, COOLDOWN_MAX_ENTRIES, COOLDOWN_DB_PATH,
+                    RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_DB_PATH, SELECTION_SCORE_WEIGHT,
+                    SELECTION_RECENT_PENALTY, SELECTION_RECENT_WINDOW, SELECTION_CHANNEL_HISTORY,
+                    MESSAGE_MAP_MAX_ENTRIES, CHANGE_CHECK_INTERVAL)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class QuotesManager:
-    def __init__(self):
-        """Initialize the quotes manager with database connection"""
-        db_url = os.environ.get('DATABASE_URL', DATABASE_URL)
-        self.engine = create_engine(db_url, connect_args={"sslmode": "require"})
-        Base.metadata.create_all(self.engine)
+    def __init__(self, engine=None):
+        """Initialize the quotes manager on the shared (or a given) database engine"""
+        self.engine = engine or get_engine()
+        self.writer = get_writer(self.engine)  # serializes write transactions on SQLite
+        upgrade(self.engine)
         self.Session = sessionmaker(bind=self.engine)
         self.personalities = PERSONALITIES
         self.setup_database()
-        self.user_cooldowns = {}  # {user_id: {command: last_used_timestamp}}
-        self.user_specific_cooldowns = {}  # {user_id: {personality_number: last_used_timestamp}}
+        self.corpus = QuoteCorpus()
+        self.search_index = SearchIndex()
+        self.selector = None
+        # Versions are read before the corpus so a change in between causes a reload, not a miss
+        self._versions = self._read_versions()
+        self._next_change_check = time.monotonic() + CHANGE_CHECK_INTERVAL
+        self._change_lock = threading.Lock()
+        # Held while a counter change is applied to the corpus and queued, so a rebuild sees it in one of the two
+        self._apply_lock = threading.Lock()
+        # Counters the dashboard cache checks; bumped whenever votes, commands or quotes change
+        self.generations = create_generations(RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_DB_PATH)
+        self.usage_buffer = WriteBehindBuffer(self.Session, USAGE_FLUSH_INTERVAL, USAGE_FLUSH_THRESHOLD,
+                                              on_flush=self._flushed,
+                                              writer=self.writer)
+        atexit.register(self.close)
+        self.refresh_corpus()
+        self.cooldowns = create_cooldown_store(COOLDOWN_BACKEND, COOLDOWN_MAX_ENTRIES, COOLDOWN_DB_PATH)
+        self.messages = MessageQuoteMap(MESSAGE_MAP_MAX_ENTRIES)  # Discord message id -> quote id
+    
+    def close(self):
+        """Flush pending usage counters and commands before shutdown"""
+        self.usage_buffer.close()
+    
+    def _flushed(self, votes_version):
+        self.generations.bump(VOTES, COMMANDS)
+        if votes_version is not None:
+            self._saw_own_change(VOTES, votes_version)
         
     def setup_database(self):
         """Initialize database with personalities and load quotes from files"""
+        def setup(session, file_name, name):
+            personality = session.query(Personality).filter_by(file_name=file_name).first()
+            if not personality:
+                personality = Personality(name=name, file_name=file_name)
+                session.add(personality)
+                session.flush()
+                
+                # Create stats entry for this personality
+                session.add(Stats(personality_id=personality.id))
+                
+                # Load quotes for this personality
+                self._import_quotes(session, personality, file_name)
+            elif session.query(Quote.id).filter_by(personality_id=personality.id).first() is None:
+                # If personality exists but has no quotes, load them
+                self._import_quotes(session, personality, file_name)
+            session.commit()
+        
         session = self.Session()
         
         try:
-            # Create personalities if they don't exist
+            # Create personalities if they don't exist; each one is set up in a single write transaction
             for file_name, name in self.personalities.items():
                 try:
-                    personality = session.query(Personality).filter_by(file_name=file_name).first()
-                    if not personality:
-                        personality = Personality(name=name, file_name=file_name)
-                        session.add(personality)
-                        session.commit()
-                        
-                        # Create stats entry for this personality
-                        stats = Stats(personality_id=personality.id)
-                        session.add(stats)
-                        session.commit()
-                        
-                        # Load quotes for this personality
-                        self.load_quotes_from_file(personality.id, file_name)
-                    elif session.query(Quote).filter_by(personality_id=personality.id).count() == 0:
-                        # If personality exists but has no quotes, load them
-                        self.load_quotes_from_file(personality.id, file_name)
+                    self.writer.run(setup, session, file_name, name)
                 except Exception as e:
                     logger.error(f"Error setting up {file_name}: {e}")
                     session.rollback()
@@ -55,291 +102,414 @@ class QuotesManager:
         finally:
             session.close()
     
+    def _import_quotes(self, session, personality, file_name):
+        """Bulk load a quote file for a personality inside the session's transaction"""
+        file_path = os.path.join(QUOTES_DIRECTORY, f"{file_name}.txt")
+        if not os.path.exists(file_path):
+            logger.error(f"Quote file {file_path} not found")
+            return 0
+        
+        started = time.perf_counter()
+        imported = bulk_insert_quotes(session.connection(), personality.id,
+                                      read_quote_file(file_path), QUOTE_IMPORT_CHUNK_SIZE)
+        elapsed = time.perf_counter() - started
+        personality.quotes_count = imported
+        logger.info(f"Loaded {imported} quotes for {personality.name} "
+                    f"({imported / elapsed if elapsed else 0:.0f} rows/s)")
+        return imported
+    
     def load_quotes_from_file(self, personality_id, file_name):
         """Load quotes from a file into the database"""
+        def write():
+            personality = session.get(Personality, personality_id)
+            if not personality:
+                return 0
+            imported = self._import_quotes(session, personality, file_name)
+            session.commit()
+            return imported
+        
         session = self.Session()
-        file_path = os.path.join(QUOTES_DIRECTORY, f"{file_name}.txt")
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                for i, line in enumerate(file, 1):
-                    line = line.strip()
-                    if line and not line.startswith('#'):  # Skip empty lines and comments
-                        # Each line is a quote, use line number as quote number
-                        quote = Quote(
-                            personality_id=personality_id,
-                            number=i,
-                            content=line
-                        )
-                        session.add(quote)
-            
-            session.commit()
-            
-            # Update quotes count in personality
-            personality = session.query(Personality).get(personality_id)
-            if personality:
-                personality.quotes_count = session.query(Quote).filter_by(personality_id=personality_id).count()
-                session.commit()
-                logger.info(f"Loaded {personality.quotes_count} quotes for {personality.name}")
-            
+            return self.writer.run(write)
         except Exception as e:
             session.rollback()
-            logger.error(f"Error loading quotes from {file_path}: {e}")
+            logger.error(f"Error loading quotes from {file_name}: {e}")
+            return 0
         finally:
             session.close()
     
-    def reload_quotes(self):
-        """Reload all quotes from files"""
+    def refresh_corpus(self):
+        """Rebuild the in-memory quote corpus from the database, keeping the deltas this process has not written yet"""
         session = self.Session()
         
         try:
-            # Clear existing quotes
-            session.query(Quote).delete()
-            session.commit()
-            
-            # Reset quotes count for all personalities
-            for personality in session.query(Personality).all():
-                personality.quotes_count = 0
-                session.commit()
+            # No flush may move pending deltas into the database between reading it and taking them over
+            with self.usage_buffer.paused():
+                corpus = QuoteCorpus.load(session)
+                recent_cutoff = datetime.utcnow() - timedelta(seconds=SELECTION_RECENT_WINDOW)
+                recently_used = {
+                    quote_id: last_used.replace(tzinfo=timezone.utc).timestamp()
+                    for quote_id, last_used in session.query(Quote.id, Quote.last_used).
+                    filter(Quote.last_used >= recent_cutoff)
+                }
+                selector = QuoteSelector.build(
+                    corpus, recently_used, SELECTION_SCORE_WEIGHT, SELECTION_RECENT_PENALTY,
+                    SELECTION_RECENT_WINDOW, SELECTION_CHANNEL_HISTORY,
+                    channels=self.selector.channels if self.selector else None)
+                search_index = SearchIndex.build(corpus.documents())
                 
-                # Reload quotes for this personality
-                self.load_quotes_from_file(personality.id, personality.file_name)
-            
-            logger.info("All quotes reloaded successfully")
-            return True
+                # Swap the references in one step so readers never see a half-built corpus
+                with self._apply_lock:
+                    pending_votes, pending_uses = self.usage_buffer.pending()
+                    for quote_id, uses in pending_uses.items():
+                        corpus.record_use(quote_id, uses)
+                    for quote_id, (upvotes, downvotes) in pending_votes.items():
+                        corpus.apply_vote(quote_id, upvotes, downvotes)
+                        selector.score_changed(quote_id)
+                    self.search_index = search_index
+                    self.corpus = corpus
+                    self.selector = selector
+            logger.info(f"Quote corpus loaded with {len(self.corpus)} quotes")
         except Exception as e:
-            session.rollback()
-            logger.error(f"Error reloading quotes: {e}")
-            return False
+            logger.error(f"Error loading quote corpus: {e}")
         finally:
             session.close()
     
-    def get_random_quote(self, personality_file_name=None):
-        """Get a random quote, optionally from a specific personality"""
+    def refresh_scores(self):
+        """Reload vote counters from the database, keeping the deltas this process has not written yet"""
         session = self.Session()
         
         try:
-            if personality_file_name:
-                personality = session.query(Personality).filter_by(file_name=personality_file_name).first()
-                if not personality:
-                    return None
-                
-                quotes = session.query(Quote).filter_by(personality_id=personality.id).all()
-                if not quotes:
-                    return None
-                
-                quote = random.choice(quotes)
-            else:
-                quotes = session.query(Quote).all()
-                if not quotes:
-                    return None
-                
-                quote = random.choice(quotes)
-            
-            # Update usage statistics
-            quote.last_used = datetime.utcnow()
-            quote.use_count += 1
-            
-            # Update personality stats
-            stats = session.query(Stats).filter_by(personality_id=quote.personality_id).first()
-            if stats:
-                stats.total_quotes_used += 1
-                
-            session.commit()
-            return quote
-        except Exception as e:
-            session.rollback()
-            logger.error(f"Error getting random quote: {e}")
-            return None
+            with self.usage_buffer.paused():
+                rows = session.query(Quote.id, Quote.upvotes, Quote.downvotes).all()
+                with self._apply_lock:
+                    pending, _ = self.usage_buffer.pending()
+                    counters = []
+                    for quote_id, upvotes, downvotes in rows:
+                        pending_up, pending_down = pending.get(quote_id, (0, 0))
+                        counters.append((quote_id, (upvotes or 0) + pending_up, (downvotes or 0) + pending_down))
+                    selector = self.selector
+                    changed = self.corpus.set_votes(counters)
+                    for quote_id in changed:
+                        selector.score_changed(quote_id)
         finally:
             session.close()
+        logger.info(f"Vote counters reloaded, {len(changed)} quotes changed")
     
-    def get_specific_quote(self, personality_file_name, number):
-        """Get a specific quote by personality and number"""
+    def _read_versions(self):
         session = self.Session()
-        
         try:
-            personality = session.query(Personality).filter_by(file_name=personality_file_name).first()
-            if not personality:
-                return None
-            
-            quote = session.query(Quote).filter_by(
-                personality_id=personality.id, 
-                number=number
-            ).first()
-            
-            if quote:
-                # Update usage statistics
-                quote.last_used = datetime.utcnow()
-                quote.use_count += 1
-                
-                # Update personality stats
-                stats = session.query(Stats).filter_by(personality_id=quote.personality_id).first()
-                if stats:
-                    stats.total_quotes_used += 1
+            return data_versions.current(session.connection())
+        finally:
+            session.close()
+    
+    def _saw_own_change(self, name, version):
+        """Mark a change this process committed as seen, unless another process changed it too"""
+        if self._versions.get(name) == version - 1:
+            self._versions[name] = version
+    
+    def check_for_changes(self):
+        """Pick up quote reloads and votes committed by other processes (at most every CHANGE_CHECK_INTERVAL)"""
+        if time.monotonic() < self._next_change_check or not self._change_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_change_check = time.monotonic() + CHANGE_CHECK_INTERVAL
+            try:
+                versions = self._read_versions()
+            except Exception as e:
+                logger.error(f"Error checking for data changes: {e}")
+                return
+            if versions.get(QUOTES) != self._versions.get(QUOTES):
+                logger.info("Quotes changed in another process, reloading the corpus")
+                self.refresh_corpus()
+                self.generations.bump(QUOTES)
+            elif versions.get(VOTES) != self._versions.get(VOTES):
+                self.refresh_scores()
+                self.generations.bump(VOTES)
+            self._versions = versions
+        finally:
+            self._change_lock.release()
+    
+    def reload_quotes(self):
+        """Reload quotes from files, writing only the lines that changed"""
+        # Pending usage rows may reference quotes that are about to be deleted
+        self.usage_buffer.flush()
+        
+        def write():
+            session = self.Session()
+            deleted_ids = []
+            inserted = edited = moved = 0
+            try:
+                connection = session.connection()
+                for personality in session.query(Personality).all():
+                    file_path = os.path.join(QUOTES_DIRECTORY, f"{personality.file_name}.txt")
+                    if not os.path.exists(file_path):
+                        logger.warning(f"Quote file {file_path} not found, keeping existing quotes")
+                        continue
                     
+                    lines = list(read_quote_file(file_path))
+                    added, changed, renumbered, removed = sync_personality(connection, personality.id, lines)
+                    personality.quotes_count = len(lines)
+                    inserted += added
+                    edited += changed
+                    moved += renumbered
+                    deleted_ids.extend(removed)
+                
+                version = data_versions.bump(connection, QUOTES)
+                # All personalities change together or not at all
                 session.commit()
-            
+                return inserted, edited, moved, deleted_ids, version
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+        
+        try:
+            inserted, edited, moved, deleted_ids, version = self.writer.run(write)
+        except Exception as e:
+            logger.error(f"Error reloading quotes: {e}")
+            return False
+        
+        # Swap in the new corpus first so no request can pick a deleted quote after it was forgotten
+        self.refresh_corpus()
+        self._saw_own_change(QUOTES, version)
+        self.usage_buffer.forget_quotes(deleted_ids)
+        self.messages.forget_quotes(deleted_ids)
+        self.generations.bump(QUOTES)
+        logger.info(f"Quotes reloaded: {inserted} added, {edited} edited, {moved} renumbered, "
+                    f"{len(deleted_ids)} removed")
+        return True
+    
+    def get_random_quote(self, personality_file_name=None, channel_id=None):
+        """Get a random quote weighted by score and recent use, avoiding the channel's last picks"""
+        quote = self.selector.pick(personality_file_name, channel_id)
+        if quote:
+            self._record_usage(quote, channel_id)
+        return quote
+    
+    def get_random_quotes(self, count, personality_file_name=None):
+        """Get up to `count` distinct random quotes without recording usage (used by the web API)"""
+        return self.corpus.sample(count, personality_file_name)
+    
+    def get_specific_quote(self, personality_file_name, number):
+        """Get a specific quote by personality and number"""
+        quote = self.corpus.get(personality_file_name, number)
+        if quote:
+            self._record_usage(quote)
+        return quote
+    
+    def get_quote(self, quote_id):
+        """Get a quote by id without touching usage statistics"""
+        # The corpus includes vote and usage deltas that have not been flushed yet
+        quote = self.corpus.get_by_id(quote_id)
+        if quote:
             return quote
+        
+        session = self.Session()
+        
+        try:
+            return session.get(Quote, quote_id, options=[joinedload(Quote.personality)])
         except Exception as e:
-            session.rollback()
-            logger.error(f"Error getting specific quote: {e}")
+            logger.error(f"Error loading quote {quote_id}: {e}")
             return None
         finally:
             session.close()
     
-    def record_command(self, user_id, command, quote_id=None):
-        """Record command usage"""
+    def remember_message(self, message_id, quote_id):
+        """Link a sent Discord message to the quote it shows, for routing reactions"""
+        self.messages.put(message_id, quote_id)
+        self.usage_buffer.add_message(message_id, quote_id)
+    
+    def cached_quote_for_message(self, message_id):
+        """Quote shown by a recently sent message, without touching the database"""
+        quote_id = self.messages.get(message_id)
+        return self.corpus.get_by_id(quote_id) if quote_id is not None else None
+    
+    def quote_for_message(self, message_id, title=None):
+        """Quote shown by a message, from the message map, the quote_messages table or the embed title
+        
+        The title ("Name #N") is only used for messages sent before messages were recorded.
+        """
+        quote = self.cached_quote_for_message(message_id)
+        if quote:
+            return quote
+        
         session = self.Session()
         
         try:
-            command_record = Command(
-                user_id=user_id,
-                command=command,
-                quote_id=quote_id
-            )
-            session.add(command_record)
-            session.commit()
+            quote_id = session.query(QuoteMessage.quote_id).filter(QuoteMessage.message_id == message_id).scalar()
         except Exception as e:
-            session.rollback()
-            logger.error(f"Error recording command: {e}")
+            logger.error(f"Error looking up message {message_id}: {e}")
+            quote_id = None
         finally:
             session.close()
+        
+        if quote_id is not None:
+            quote = self.corpus.get_by_id(quote_id)
+        elif title:
+            name, _, number = title.rpartition(' #')
+            bucket = next((bucket for bucket in self.corpus.by_file_name.values()
+                           if bucket.personality.name == name), None)
+            if bucket and number.isdigit():
+                quote = self.corpus.get(bucket.personality.file_name, int(number))
+        if quote:
+            self.messages.put(message_id, quote.id)
+        return quote
+    
+    def _record_usage(self, quote, channel_id=None):
+        """Queue usage counters for a quote served from the corpus"""
+        with self._apply_lock:
+            self.corpus.record_use(quote.id)
+            self.selector.mark_used(quote.id, channel_id)
+            self.usage_buffer.add_usage(quote.id, quote.personality_id)
+        quote.use_count += 1
+    
+    def record_command(self, user_id, command, quote_id=None):
+        """Record command usage"""
+        quote = self.corpus.get_by_id(quote_id) if quote_id else None
+        self.usage_buffer.add_command(user_id, command, quote_id, quote.personality_id if quote else None)
     
     def record_vote(self, user_id, quote_id, vote_value):
-        """Record a vote (1 for upvote, -1 for downvote)"""
-        session = self.Session()
+        """Record a vote (1 for upvote, -1 for downvote)
+        
+        Returns the quote with its updated counters, or None if the vote could not be recorded.
+        """
+        statuses = self.record_votes([(user_id, quote_id, vote_value)])
+        if statuses is None or statuses[0] == 'unknown_quote':
+            return None
+        return self.get_quote(quote_id)
+    
+    def _personality_ids_for(self, connection, quote_ids):
+        """{quote_id: personality_id} for the ids that exist, from the corpus with a database fallback"""
+        found = {}
+        for quote_id in quote_ids:
+            quote = self.corpus.get_by_id(quote_id)
+            if quote:
+                found[quote_id] = quote.personality_id
+        missing = [quote_id for quote_id in quote_ids if quote_id not in found]
+        for start in range(0, len(missing), 1000):
+            found.update(connection.execute(
+                select(Quote.id, Quote.personality_id).where(Quote.id.in_(missing[start:start + 1000]))).all())
+        return found
+    
+    def record_votes(self, votes):
+        """Store many (user_id, quote_id, vote_value) votes in one transaction (the bot's and web's vote path)
+        
+        A later vote by the same user for the same quote replaces an earlier one. Returns one
+        status per vote: 'inserted', 'changed', 'unchanged', 'superseded' or 'unknown_quote',
+        or None if the transaction failed.
+        """
+        latest = {}
+        for position, (user_id, quote_id, _) in enumerate(votes):
+            latest[user_id, quote_id] = position
+        
+        def write():
+            session = self.Session()
+            try:
+                connection = session.connection()
+                personality_ids = self._personality_ids_for(connection, list({quote_id for _, quote_id in latest}))
+                deltas = upsert_votes(connection, {
+                    pair: votes[position][2] for pair, position in latest.items() if pair[1] in personality_ids})
+                session.commit()
+                return personality_ids, deltas
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
         
         try:
-            # Check if user already voted for this quote
-            existing_vote = session.query(Vote).filter_by(
-                user_id=user_id,
-                quote_id=quote_id
-            ).first()
-            
-            if existing_vote:
-                # Update existing vote
-                if existing_vote.vote != vote_value:
-                    old_vote = existing_vote.vote
-                    existing_vote.vote = vote_value
-                    existing_vote.timestamp = datetime.utcnow()
-                    
-                    # Update quote and stats
-                    quote = session.query(Quote).get(quote_id)
-                    if quote:
-                        # Remove the old vote
-                        if old_vote == 1:
-                            quote.upvotes -= 1
-                            session.query(Stats).filter_by(personality_id=quote.personality_id).update(
-                                {"total_upvotes": Stats.total_upvotes - 1})
-                        else:
-                            quote.downvotes -= 1
-                            session.query(Stats).filter_by(personality_id=quote.personality_id).update(
-                                {"total_downvotes": Stats.total_downvotes - 1})
-                        
-                        # Add the new vote
-                        if vote_value == 1:
-                            quote.upvotes += 1
-                            session.query(Stats).filter_by(personality_id=quote.personality_id).update(
-                                {"total_upvotes": Stats.total_upvotes + 1})
-                        else:
-                            quote.downvotes += 1
-                            session.query(Stats).filter_by(personality_id=quote.personality_id).update(
-                                {"total_downvotes": Stats.total_downvotes + 1})
-            else:
-                # Create new vote
-                new_vote = Vote(
-                    user_id=user_id,
-                    quote_id=quote_id,
-                    vote=vote_value
-                )
-                session.add(new_vote)
-                
-                # Update quote and stats
-                quote = session.query(Quote).get(quote_id)
-                if quote:
-                    if vote_value == 1:
-                        quote.upvotes += 1
-                        session.query(Stats).filter_by(personality_id=quote.personality_id).update(
-                            {"total_upvotes": Stats.total_upvotes + 1})
-                    else:
-                        quote.downvotes += 1
-                        session.query(Stats).filter_by(personality_id=quote.personality_id).update(
-                            {"total_downvotes": Stats.total_downvotes + 1})
-            
-            session.commit()
-            return True
+            personality_ids, deltas = self.writer.run(write)
         except Exception as e:
-            session.rollback()
-            logger.error(f"Error recording vote: {e}")
-            return False
-        finally:
-            session.close()
+            logger.error(f"Error recording {len(votes)} votes: {e}")
+            return None
+        
+        # Counters on quotes and stats are applied in coalesced batches by the write-behind buffer,
+        # which also bumps the VOTES data version for the other processes
+        changed = False
+        with self._apply_lock:
+            for (_, quote_id), (upvotes, downvotes) in deltas.items():
+                if upvotes or downvotes:
+                    self.corpus.apply_vote(quote_id, upvotes, downvotes)
+                    self.selector.score_changed(quote_id)
+                    self.usage_buffer.add_vote(quote_id, personality_ids[quote_id], upvotes, downvotes)
+                    changed = True
+        if changed:
+            self.generations.bump(VOTES)
+        
+        statuses = []
+        for position, (user_id, quote_id, _) in enumerate(votes):
+            if latest[user_id, quote_id] != position:
+                statuses.append('superseded')
+            elif quote_id not in personality_ids:
+                statuses.append('unknown_quote')
+            else:
+                upvotes, downvotes = deltas[user_id, quote_id]
+                statuses.append('unchanged' if not (upvotes or downvotes) else
+                                'inserted' if upvotes + downvotes == 1 else 'changed')
+        return statuses
     
-    def get_top_quotes(self, limit=10):
+    def get_top_quotes(self, limit=10, personality_file_name=None):
         """Get top quotes by score (upvotes - downvotes)"""
-        session = self.Session()
+        return self.corpus.top(limit, personality_file_name)
+    
+    def search_quote_ids(self, query, personality_file_name=None, offset=0, limit=None):
+        """Full-text search returning (total_matches, ranked quote ids for the page)"""
+        personality = None
+        if personality_file_name:
+            personality = self.corpus.personality(personality_file_name)
+            if not personality:
+                return 0, []
+        personality_id = personality.id if personality else None
         
-        try:
-            top_quotes = session.query(Quote).\
-                order_by((Quote.upvotes - Quote.downvotes).desc()).\
-                limit(limit).all()
-            return top_quotes
-        except Exception as e:
-            logger.error(f"Error getting top quotes: {e}")
-            return []
-        finally:
-            session.close()
+        if SEARCH_BACKEND == 'postgres' and self.engine.dialect.name == 'postgresql':
+            return self._search_postgres(query, personality_id, offset, limit)
+        return self.search_index.search(query, personality_id, offset, limit)
     
-    def search_quotes(self, query, personality_file_name=None):
-        """Search quotes by content, optionally from a specific personality"""
+    def _search_postgres(self, query, personality_id, offset, limit):
+        """Ranked search against the generated tsvector column and its GIN index"""
+        tsquery = to_tsquery(query)
+        if not tsquery:
+            return 0, []
+        
         session = self.Session()
         
         try:
-            search_query = f"%{query}%"
-            if personality_file_name:
-                personality = session.query(Personality).filter_by(file_name=personality_file_name).first()
-                if not personality:
-                    return []
-                
-                results = session.query(Quote).filter(
-                    Quote.personality_id == personality.id,
-                    Quote.content.like(search_query)
-                ).all()
-            else:
-                results = session.query(Quote).filter(
-                    Quote.content.like(search_query)
-                ).all()
-            
-            return results
+            rows = session.execute(text(
+                "SELECT id, count(*) OVER () AS total FROM quotes, to_tsquery('simple', :tsquery) AS q "
+                "WHERE search_vector @@ q AND (CAST(:personality_id AS integer) IS NULL OR personality_id = :personality_id) "
+                "ORDER BY ts_rank(search_vector, q) DESC, id "
+                "LIMIT :limit OFFSET :offset"),
+                {'tsquery': tsquery, 'personality_id': personality_id, 'limit': limit, 'offset': offset}).all()
+            if not rows:
+                return 0, []
+            return rows[0].total, [row.id for row in rows]
         except Exception as e:
+            session.rollback()
             logger.error(f"Error searching quotes: {e}")
-            return []
+            return 0, []
         finally:
             session.close()
     
+    def search_quotes_page(self, query, personality_file_name=None, offset=0, limit=None):
+        """Search quotes by content and return (total_matches, quotes for the page)"""
+        total, quote_ids = self.search_quote_ids(query, personality_file_name, offset, limit)
+        quotes = [self.corpus.get_by_id(quote_id) for quote_id in quote_ids]
+        return total, [quote for quote in quotes if quote]
+    
+    def search_quotes(self, query, personality_file_name=None):
+        """Search quotes by content, optionally from a specific personality"""
+        return self.search_quotes_page(query, personality_file_name)[1]
+    
     def get_statistics(self):
         """Get general statistics"""
         session = self.Session()
         
         try:
-            stats = {
-                'total_quotes': session.query(func.count(Quote.id)).scalar(),
-                'total_commands': session.query(func.count(Command.id)).scalar(),
-                'total_votes': session.query(func.count(Vote.id)).scalar(),
-                'personality_stats': []
-            }
-            
-            for personality in session.query(Personality).all():
-                p_stats = session.query(Stats).filter_by(personality_id=personality.id).first()
-                personality_data = {
-                    'name': personality.name,
-                    'quotes_count': personality.quotes_count,
-                    'total_quotes_used': p_stats.total_quotes_used if p_stats else 0,
-                    'total_upvotes': p_stats.total_upvotes if p_stats else 0,
-                    'total_downvotes': p_stats.total_downvotes if p_stats else 0
-                }
-                stats['personality_stats'].append(personality_data)
+            stats = stats_service.totals(session)
+            stats['personality_stats'] = stats_service.personality_vote_totals(session)
             
             return stats
         except Exception as e:
@@ -350,30 +520,12 @@ class QuotesManager:
     
     def check_cooldown(self, user_id, command):
         """Check if user is in cooldown for a command"""
-        if user_id not in self.user_cooldowns:
-            self.user_cooldowns[user_id] = {}
-        
-        current_time = datetime.now()
-        if command in self.user_cooldowns[user_id]:
-            last_used = self.user_cooldowns[user_id][command]
-            if (current_time - last_used).total_seconds() < COOLDOWN_TIME:
-                return False
-        
-        self.user_cooldowns[user_id][command] = current_time
-        return True
+        allowed, _ = self.cooldowns.check(f"cmd:{user_id}:{command}", COOLDOWN_TIME)
+        return allowed
     
     def check_specific_quote_cooldown(self, user_id, personality_number):
         """Check if user is in cooldown for a specific quote"""
-        cooldown_key = f"{personality_number}"
-        if user_id not in self.user_specific_cooldowns:
-            self.user_specific_cooldowns[user_id] = {}
-        
-        current_time = datetime.now()
-        if cooldown_key in self.user_specific_cooldowns[user_id]:
-            last_used = self.user_specific_cooldowns[user_id][cooldown_key]
-            if (current_time - last_used).total_seconds() < SPECIFIC_QUOTE_COOLDOWN:
-                time_left = SPECIFIC_QUOTE_COOLDOWN - (current_time - last_used).total_seconds()
-                return False, int(time_left // 60) + 1  # Return minutes left
-        
-        self.user_specific_cooldowns[user_id][cooldown_key] = current_time
+        allowed, time_left = self.cooldowns.check(f"quote:{user_id}:{personality_number}", SPECIFIC_QUOTE_COOLDOWN)
+        if not allowed:
+            return False, int(time_left // 60) + 1  # Return minutes left
         return True, 0
@@ -0,0 +1,112 @@
+"""
+Central routing of reaction events to per-message handlers.
+send_quote_embed registers a handler for each message it sends; on_raw_reaction_add looks
+the message id up once, instead of discord.py running a wait_for predicate per pending
+message on every reaction. Registrations expire on a hashed timing wheel, so neither
+registering nor expiring depends on how many messages are being listened to.
+"""
+import asyncio
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+
+class TimingWheel:
+    """Hashed timing wheel: O(1) schedule and cancel, expiries collected once per tick"""
+
+    def __init__(self, tick, slots):
+        self.tick = tick
+        self._slots = [set() for _ in range(slots)]
+        self._position = 0
+        self._entries = {}  # {key: [slot, full turns of the wheel left]}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def schedule(self, key, delay):
+        """Expire key after delay seconds (rounded up to whole ticks), replacing any earlier schedule"""
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self._position + ticks) % len(self._slots)
+        self._slots[slot].add(key)
+        self._entries[key] = [slot, (ticks - 1) // len(self._slots)]
+
+    def cancel(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._slots[entry[0]].discard(key)
+
+    def advance(self):
+        """Move one tick forward and return the keys that expired"""
+        self._position = (self._position + 1) % len(self._slots)
+        slot = self._slots[self._position]
+        expired = []
+        for key in list(slot):
+            entry = self._entries[key]
+            if entry[1]:
+                entry[1] -= 1
+            else:
+                slot.discard(key)
+                del self._entries[key]
+                expired.append(key)
+        return expired
+
+
+class ReactionDispatcher:
+    """Message id -> reaction handler, each registration expiring after a timeout"""
+
+    def __init__(self, timeout, tick=1.0):
+        self.timeout = timeout
+        self._handlers = {}
+        self._wheel = TimingWheel(tick, math.ceil(timeout / tick) + 1)
+        self._task = None
+        self.registered = 0
+        self.dispatched = 0
+        self.expired = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def register(self, message_id, handler, timeout=None):
+        """Call `await handler(emoji, user_id)` for reactions on message_id until the timeout"""
+        self._handlers[message_id] = handler
+        self._wheel.schedule(message_id, self.timeout if timeout is None else timeout)
+        self.registered += 1
+
+    def unregister(self, message_id):
+        self._handlers.pop(message_id, None)
+        self._wheel.cancel(message_id)
+
+    async def dispatch(self, message_id, emoji, user_id):
+        """Run the message's handler; returns False when nothing is registered for it"""
+        handler = self._handlers.get(message_id)
+        if handler is None:
+            return False
+        self.dispatched += 1
+        try:
+            await handler(emoji, user_id)
+        except Exception as e:
+            logger.error(f"Error handling reaction on message {message_id}: {e}")
+        return True
+
+    def metrics(self):
+        return {
+            'active': len(self._handlers),
+            'registered': self.registered,
+            'dispatched': self.dispatched,
+            'expired': self.expired
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._wheel.tick)
+            for message_id in self._wheel.advance():
+                if self._handlers.pop(message_id, None) is not None:
+                    self.expired += 1
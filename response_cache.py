@@ -0,0 +1,231 @@
+"""
+Response caching for the web dashboard.
+Every cached view depends on named generation counters ('votes', 'commands', 'quotes').
+Writers bump a counter when data changes; a cached response is served only while the
+counters it was rendered under are unchanged and its TTL has not run out.
+"""
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response
+
+VOTES = 'votes'
+COMMANDS = 'commands'
+QUOTES = 'quotes'
+
+
+class MemoryGenerations:
+    """Generation counters for a single process"""
+
+    def __init__(self):
+        self._values = {}  # {name: generation}
+        self._lock = threading.Lock()
+
+    def bump(self, *names):
+        with self._lock:
+            for name in names:
+                self._values[name] = self._values.get(name, 0) + 1
+
+    def current(self, names):
+        """Current generation of each name, as a tuple"""
+        with self._lock:
+            return tuple(self._values.get(name, 0) for name in names)
+
+
+class _SQLiteStore:
+    """Thread-local connections to a local SQLite file shared by every process on the host"""
+
+    SCHEMA = ()
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        for statement in self.SCHEMA:
+            connection.execute(statement)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+
+class SQLiteGenerations(_SQLiteStore):
+    """Generation counters shared by the bot and every gunicorn worker"""
+
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS cache_generations (name TEXT PRIMARY KEY, generation INTEGER NOT NULL)",)
+
+    def bump(self, *names):
+        self._connection().executemany(
+            "INSERT INTO cache_generations (name, generation) VALUES (?, 1) "
+            "ON CONFLICT (name) DO UPDATE SET generation = generation + 1",
+            [(name,) for name in names])
+
+    def current(self, names):
+        rows = dict(self._connection().execute(
+            f"SELECT name, generation FROM cache_generations WHERE name IN ({', '.join('?' * len(names))})", names))
+        return tuple(rows.get(name, 0) for name in names)
+
+
+class CachedResponse:
+    __slots__ = ('generations', 'expires_at', 'rendered_at', 'body', 'status', 'mimetype', 'etag')
+
+    def __init__(self, generations, expires_at, rendered_at, body, status, mimetype):
+        self.generations = generations
+        self.expires_at = expires_at
+        self.rendered_at = rendered_at
+        self.body = body
+        self.status = status
+        self.mimetype = mimetype
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class MemoryResponseStore:
+    """Per-process LRU of rendered responses"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteResponseStore(_SQLiteStore):
+    """Rendered responses in a local SQLite file so gunicorn workers share one cache"""
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS cached_responses "
+        "(key TEXT PRIMARY KEY, entry BLOB NOT NULL, accessed_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS ix_cached_responses_accessed_at ON cached_responses (accessed_at)",
+    )
+
+    def __init__(self, path, max_entries):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self.evicted = 0
+
+    def get(self, key):
+        connection = self._connection()
+        row = connection.execute("SELECT entry FROM cached_responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE cached_responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return pickle.loads(row[0])
+
+    def put(self, key, entry):
+        connection = self._connection()
+        connection.execute(
+            "INSERT INTO cached_responses (key, entry, accessed_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET entry = excluded.entry, accessed_at = excluded.accessed_at",
+            (key, pickle.dumps(entry), time.time()))
+        self.evicted += connection.execute(
+            "DELETE FROM cached_responses WHERE key IN (SELECT key FROM cached_responses "
+            "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)).rowcount
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM cached_responses").fetchone()[0]
+
+
+class ResponseCache:
+    """Caches GET responses of Flask views and answers conditional requests"""
+
+    def __init__(self, store, generations, ttl):
+        self.store = store
+        self.generations = generations
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0  # misses caused by a generation change
+        self.not_modified = 0
+
+    def cached(self, *depends_on):
+        """Decorator for a view whose output only changes with the given generations"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                key = request.full_path
+                generations = self.generations.current(depends_on)
+                now = time.time()
+                entry = self.store.get(key)
+                if entry is not None and entry.generations == generations and entry.expires_at > now:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    if entry is not None and entry.generations != generations:
+                        self.stale += 1
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.direct_passthrough:
+                        return response
+                    previous = entry
+                    entry = CachedResponse(generations, now + self.ttl, now, response.get_data(),
+                                           response.status_code, response.mimetype)
+                    if previous is not None and previous.etag == entry.etag:
+                        entry.rendered_at = previous.rendered_at  # unchanged body keeps its Last-Modified
+                    self.store.put(key, entry)
+                return self._respond(entry)
+            return wrapper
+        return decorator
+
+    def _respond(self, entry):
+        response = make_response(entry.body, entry.status)
+        response.mimetype = entry.mimetype
+        response.set_etag(entry.etag)
+        response.last_modified = int(entry.rendered_at)
+        response.cache_control.no_cache = True  # browsers keep a copy but revalidate every time
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            self.not_modified += 1
+        return response
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'not_modified': self.not_modified,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'entries': len(self.store),
+            'evicted': self.store.evicted
+        }
+
+
+def create_generations(backend, sqlite_path):
+    if backend == 'sqlite':
+        return SQLiteGenerations(sqlite_path)
+    return MemoryGenerations()
+
+
+def create_response_cache(backend, generations, max_entries, ttl, sqlite_path):
+    if backend == 'sqlite':
+        return ResponseCache(SQLiteResponseStore(sqlite_path, max_entries), generations, ttl)
+    return ResponseCache(MemoryResponseStore(max_entries), generations, ttl)
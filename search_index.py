@@ -0,0 +1,121 @@
+import heapq
+import math
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+# Characters that do not decompose under NFKD and need an explicit ASCII fallback
+_FOLD = str.maketrans({'ł': 'l', 'Ł': 'l', 'đ': 'd', 'ø': 'o', 'ß': 'ss'})
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """Lowercase and strip diacritics so 'Łódź' and 'lodz' compare equal"""
+    text = unicodedata.normalize('NFKD', text.translate(_FOLD).lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    """Split text into normalized search terms"""
+    return _TOKEN.findall(normalize(text))
+
+
+def to_tsquery(query):
+    """Build a prefix-matching tsquery string from free text (tokens are already [a-z0-9] only)"""
+    return ' & '.join(f"{term}:*" for term in dict.fromkeys(tokenize(query)))
+
+
+class SearchIndex:
+    """In-process inverted index over quote content with prefix matching and idf ranking
+
+    Every query term must match the start of some word in the quote. Exact word matches
+    rank above prefix matches, and rare words rank above common ones.
+    """
+
+    def __init__(self):
+        self.postings = {}  # {term: array of quote ids, ascending}
+        self.by_personality = {}  # {personality_id: set of quote ids}
+        self._vocabulary = []  # sorted terms for prefix lookups
+        self._documents = 0
+
+    @classmethod
+    def build(cls, documents):
+        """Index an iterable of (quote_id, personality_id, content), in ascending id order per term"""
+        index = cls()
+        for quote_id, personality_id, content in documents:
+            index.by_personality.setdefault(personality_id, set()).add(quote_id)
+            index._documents += 1
+            for term in set(tokenize(content)):
+                postings = index.postings.get(term)
+                if postings is None:
+                    postings = index.postings[term] = array('q')
+                postings.append(quote_id)
+        for term, postings in index.postings.items():
+            index.postings[term] = array('q', sorted(postings))
+        index._vocabulary = sorted(index.postings)
+        return index
+
+    def _expand(self, prefix):
+        """Indexed terms starting with prefix, best ranked first"""
+        start = bisect_left(self._vocabulary, prefix)
+        terms = []
+        for term in self._vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            terms.append((self._idf(term) * (2.0 if term == prefix else 1.0), term))
+        terms.sort(key=lambda weighted: -weighted[0])
+        return terms
+
+    def _idf(self, term):
+        return math.log(1 + self._documents / len(self.postings[term]))
+
+    def search(self, query, personality_id=None, offset=0, limit=None):
+        """Return (total_matches, ranked quote ids for the requested page)"""
+        expansions = []
+        for prefix in dict.fromkeys(tokenize(query)):
+            terms = self._expand(prefix)
+            if not terms:
+                return 0, []
+            expansions.append(terms)
+
+        if not expansions:
+            return 0, []
+
+        # Candidate filtering happens with set operations; Python-level work is
+        # limited to ranking, and single-term queries only rank the requested page
+        matches = [set().union(*(self.postings[term] for _, term in terms)) for terms in expansions]
+        matches.sort(key=len)
+        candidates = matches[0].intersection(*matches[1:])
+        if personality_id is not None:
+            candidates &= self.by_personality.get(personality_id, set())
+        total = len(candidates)
+        wanted = total if limit is None else min(total, offset + limit)
+
+        if len(expansions) == 1:
+            ranked, seen = [], set()
+            for _, term in expansions[0]:
+                for quote_id in self.postings[term]:
+                    if quote_id in candidates and quote_id not in seen:
+                        seen.add(quote_id)
+                        ranked.append(quote_id)
+                        if len(ranked) >= wanted:
+                            return total, ranked[offset:]
+            return total, ranked[offset:]
+
+        scores = dict.fromkeys(candidates, 0.0)
+        for terms in expansions:
+            # Each candidate scores the best-weighted expansion of this term it contains
+            remaining = set(candidates)
+            for weight, term in terms:
+                hits = remaining.intersection(self.postings[term])
+                remaining -= hits
+                for quote_id in hits:
+                    scores[quote_id] += weight
+                if not remaining:
+                    break
+
+        def rank(quote_id):
+            return -scores[quote_id], quote_id
+
+        return total, heapq.nsmallest(wanted, scores, key=rank)[offset:]
@@ -0,0 +1,126 @@
+"""
+Zulte Kroniki Reaction Load Simulator
+Drives the reaction dispatcher and edit scheduler with bursty votes against a fake
+gateway whose channels enforce an edit rate limit (answering 429 with rate-limit
+headers), and counts the edits that reach it. No Discord connection or database.
+
+Usage: python simulate_reactions.py [--messages N] [--reactions N] [--duration S] [--window S]
+"""
+import asyncio
+import random
+import argparse
+import discord
+from reaction_dispatcher import ReactionDispatcher
+from edit_scheduler import EditScheduler
+
+
+class FakeResponse:
+    status = 429
+    reason = 'Too Many Requests'
+
+    def __init__(self, reset_after):
+        self.headers = {'X-RateLimit-Reset-After': f"{reset_after:.3f}", 'X-RateLimit-Remaining': '0'}
+
+
+class FakeChannel:
+    """Channel edit bucket: `limit` edits per `per` seconds, like Discord's per-channel message bucket"""
+
+    def __init__(self, id, limit, per):
+        self.id = id
+        self.limit = limit
+        self.per = per
+        self.sent = []  # loop times of accepted edits
+        self.rejected = 0
+
+    def take(self):
+        now = asyncio.get_running_loop().time()
+        self.sent = [at for at in self.sent if at > now - self.per]
+        if len(self.sent) >= self.limit:
+            self.rejected += 1
+            raise discord.HTTPException(FakeResponse(self.sent[0] + self.per - now), "You are being rate limited.")
+        self.sent.append(now)
+
+
+class FakeMessage:
+    def __init__(self, id, channel):
+        self.id = id
+        self.channel = channel
+        self.footer = None
+        self.edits = 0
+
+    async def edit(self, embed):
+        await asyncio.sleep(0.05)  # round trip
+        self.channel.take()
+        self.edits += 1
+        self.footer = embed.footer.text
+
+
+async def simulate(args, coalesce):
+    channels = [FakeChannel(channel_id, 5, 5.0) for channel_id in range(args.channels)]
+    messages = [FakeMessage(message_id, channels[message_id % len(channels)]) for message_id in range(args.messages)]
+    dispatcher = ReactionDispatcher(args.duration + 60, 1.0)
+    scheduler = EditScheduler(args.window)
+    votes = {message.id: 0 for message in messages}
+
+    def register(message):
+        embed = discord.Embed(title=f"Quote #{message.id}")
+
+        async def on_vote(emoji, user_id):
+            votes[message.id] += 1
+            embed.set_footer(text=f"👍 {votes[message.id]}")
+            if coalesce:
+                scheduler.schedule(message, embed)
+            else:
+                try:
+                    await message.edit(embed=embed)
+                except discord.HTTPException:
+                    pass
+        dispatcher.register(message.id, on_vote)
+
+    for message in messages:
+        register(message)
+
+    # Each message gets its reactions in bursts: most arrive within a second of each other
+    arrivals = []
+    for message in messages:
+        for _ in range(args.reactions):
+            burst = random.random() * args.duration
+            arrivals.append((burst + random.expovariate(5.0), message.id))
+    arrivals.sort()
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    handlers = []
+    for at, message_id in arrivals:
+        await asyncio.sleep(max(0.0, started + at - loop.time()))
+        handlers.append(loop.create_task(dispatcher.dispatch(message_id, '✅', None)))
+    await asyncio.gather(*handlers)
+    while scheduler.metrics()['sending']:
+        await asyncio.sleep(0.1)
+
+    stale = sum(message.footer != f"👍 {votes[message.id]}" for message in messages)
+    return {
+        'reactions': len(arrivals),
+        'edits sent': sum(message.edits for message in messages),
+        '429 responses': sum(channel.rejected for channel in channels),
+        'stale footers': stale,
+        'seconds': round(loop.time() - started, 1),
+        'scheduler': scheduler.metrics() if coalesce else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count message edits under bursty reaction load")
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--channels', type=int, default=4)
+    parser.add_argument('--reactions', type=int, default=30, help="reactions per message")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds over which bursts start")
+    parser.add_argument('--window', type=float, default=2.0, help="edit window of the scheduler")
+    args = parser.parse_args()
+
+    for name, coalesce in (("edit per reaction", False), ("edit scheduler", True)):
+        print(f"{name}: {asyncio.run(simulate(args, coalesce))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Aggregated statistics for the dashboard, the stats page and the bot's /stats command.
+Every function issues a fixed number of grouped or windowed queries, independent of
+the number of personalities or days requested.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, desc
+from sqlalchemy.orm import joinedload
+from models import Personality, Quote, Vote, Stats, CommandUsage
+import command_rollup
+
+
+def totals(session):
+    """Quote, command and vote counts in a single round trip
+
+    Commands are counted from the hourly rollup, which keeps archived commands.
+    """
+    row = session.execute(select(
+        select(func.count(Quote.id)).scalar_subquery().label('total_quotes'),
+        select(func.sum(CommandUsage.count)).scalar_subquery().label('total_commands'),
+        select(func.count(Vote.id)).scalar_subquery().label('total_votes')
+    )).one()
+    return {
+        'total_quotes': row.total_quotes or 0,
+        'total_commands': row.total_commands or 0,
+        'total_votes': row.total_votes or 0
+    }
+
+
+def top_quotes(session, limit):
+    """Highest scoring quotes with their personality loaded in the same query"""
+    return session.query(Quote).options(joinedload(Quote.personality)).\
+        order_by(Quote.score.desc()).limit(limit).all()
+
+
+def recent_quotes(session, limit):
+    """Most recently used quotes with their personality loaded in the same query"""
+    return session.query(Quote).options(joinedload(Quote.personality)).\
+        filter(Quote.last_used != None).\
+        order_by(Quote.last_used.desc()).limit(limit).all()
+
+
+def command_counts(session, limit):
+    """Most used commands, including archived ones (from the hourly rollup)"""
+    return session.query(
+        CommandUsage.command,
+        func.sum(CommandUsage.count).label('count')
+    ).group_by(CommandUsage.command).order_by(desc('count')).limit(limit).all()
+
+
+def top_quotes_by_personality(session, limit):
+    """{personality_id: [best quotes]} from one windowed query"""
+    ranked = select(
+        Quote.id,
+        func.row_number().over(
+            partition_by=Quote.personality_id,
+            order_by=(Quote.score.desc(), Quote.id)
+        ).label('position')
+    ).subquery()
+    result = {}
+    for quote in session.query(Quote).join(ranked, ranked.c.id == Quote.id).\
+            filter(ranked.c.position <= limit).\
+            order_by(Quote.personality_id, ranked.c.position):
+        result.setdefault(quote.personality_id, []).append(quote)
+    return result
+
+
+def personality_stats(session):
+    """Per-personality quote count, total uses and most popular quote in two queries"""
+    rows = session.query(
+        Personality,
+        func.count(Quote.id).label('quote_count'),
+        func.coalesce(func.sum(Quote.use_count), 0).label('used_count')
+    ).outerjoin(Quote, Quote.personality_id == Personality.id).\
+        group_by(Personality.id).order_by(Personality.id).all()
+    most_popular = top_quotes_by_personality(session, 1)
+    return [{
+        'personality': personality,
+        'quote_count': quote_count,
+        'used_count': used_count,
+        'most_popular': most_popular.get(personality.id, [None])[0]
+    } for personality, quote_count, used_count in rows]
+
+
+def personality_vote_totals(session):
+    """Personalities joined with their running Stats counters, as used by the bot"""
+    rows = session.query(Personality, Stats).\
+        outerjoin(Stats, Stats.personality_id == Personality.id).order_by(Personality.id).all()
+    return [{
+        'name': personality.name,
+        'quotes_count': personality.quotes_count,
+        'total_quotes_used': stats.total_quotes_used if stats else 0,
+        'total_upvotes': stats.total_upvotes if stats else 0,
+        'total_downvotes': stats.total_downvotes if stats else 0
+    } for personality, stats in rows]
+
+
+def daily_command_usage(session, days=7, granularity='day'):
+    """Command counts per day (or hour) for the last `days` days, oldest first, zero-filled"""
+    now = datetime.utcnow()
+    span = timedelta(hours=24 * days - 1) if granularity == 'hour' else timedelta(days=days - 1)
+    return command_rollup.usage_series(session, now - span, now, granularity)
@@ -0,0 +1,96 @@
+from datetime import datetime
+from sqlalchemy import select, insert, update, literal_column, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import Vote, Quote, Stats
+
+CHUNK_SIZE = 1000  # (user_id, quote_id) pairs per statement
+
+
+def vote_deltas(old_vote, new_vote):
+    """Return the (upvotes, downvotes) change caused by replacing old_vote with new_vote"""
+    upvotes = (new_vote == 1) - (old_vote == 1)
+    downvotes = (new_vote == -1) - (old_vote == -1)
+    return upvotes, downvotes
+
+
+def _chunks(items):
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+def upsert_votes(connection, new_votes):
+    """Insert or flip votes for {(user_id, quote_id): vote_value} with set-based statements
+
+    Returns {(user_id, quote_id): (upvotes_delta, downvotes_delta)} for every pair;
+    an unchanged vote maps to (0, 0). Runs inside the caller's transaction.
+    """
+    votes = Vote.__table__
+    now = datetime.utcnow()
+    deltas = dict.fromkeys(new_votes, (0, 0))
+    pairs = list(new_votes)
+
+    if connection.dialect.name == 'postgresql':
+        for chunk in _chunks(pairs):
+            stmt = pg_insert(votes).values([
+                {'user_id': user_id, 'quote_id': quote_id, 'vote': new_votes[user_id, quote_id], 'timestamp': now}
+                for user_id, quote_id in chunk])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[votes.c.user_id, votes.c.quote_id],
+                set_={'vote': stmt.excluded.vote, 'timestamp': stmt.excluded.timestamp},
+                where=votes.c.vote != stmt.excluded.vote
+            ).returning(votes.c.user_id, votes.c.quote_id, literal_column('(xmax = 0)').label('inserted'))
+            # Unchanged votes are filtered by the WHERE and return no row
+            for row in connection.execute(stmt):
+                vote_value = new_votes[row.user_id, row.quote_id]
+                deltas[row.user_id, row.quote_id] = vote_deltas(None if row.inserted else -vote_value, vote_value)
+        return deltas
+
+    old_votes = {}
+    for chunk in _chunks(pairs):
+        # Two plain IN lists can use the (user_id, quote_id) index, a row-value IN cannot on SQLite;
+        # the cross product they match is narrowed to the requested pairs here
+        wanted = set(chunk)
+        old_votes.update(((user_id, quote_id), vote) for user_id, quote_id, vote in connection.execute(
+            select(votes.c.user_id, votes.c.quote_id, votes.c.vote)
+            .where(votes.c.user_id.in_({user_id for user_id, _ in chunk}),
+                   votes.c.quote_id.in_({quote_id for _, quote_id in chunk})))
+            if (user_id, quote_id) in wanted)
+
+    inserts, flips = [], []
+    for pair, vote_value in new_votes.items():
+        old_vote = old_votes.get(pair)
+        if old_vote is None:
+            inserts.append({'user_id': pair[0], 'quote_id': pair[1], 'vote': vote_value, 'timestamp': now})
+        elif old_vote != vote_value:
+            flips.append({'b_user_id': pair[0], 'b_quote_id': pair[1], 'b_vote': vote_value})
+        else:
+            continue
+        deltas[pair] = vote_deltas(old_vote, vote_value)
+    if inserts:
+        connection.execute(insert(votes), inserts)
+    if flips:
+        connection.execute(
+            update(votes).where(votes.c.user_id == bindparam('b_user_id'), votes.c.quote_id == bindparam('b_quote_id'))
+            .values(vote=bindparam('b_vote'), timestamp=now), flips)
+    return deltas
+
+
+def apply_vote_counts(connection, quote_deltas, personality_deltas):
+    """Add {quote_id: (up, down)} to quote counters and {personality_id: (up, down)} to stats"""
+    quotes = Quote.__table__
+    stats = Stats.__table__
+    if quote_deltas:
+        connection.execute(
+            update(quotes).where(quotes.c.id == bindparam('b_id')).values(
+                upvotes=quotes.c.upvotes + bindparam('b_up'),
+                downvotes=quotes.c.downvotes + bindparam('b_down'),
+                score=quotes.c.score + bindparam('b_up') - bindparam('b_down')),
+            [{'b_id': quote_id, 'b_up': up, 'b_down': down} for quote_id, (up, down) in quote_deltas.items()])
+    if personality_deltas:
+        connection.execute(
+            update(stats).where(stats.c.personality_id == bindparam('b_personality_id')).values(
+                total_upvotes=stats.c.total_upvotes + bindparam('b_up'),
+                total_downvotes=stats.c.total_downvotes + bindparam('b_down'),
+                updated_at=datetime.utcnow()),
+            [{'b_personality_id': personality_id, 'b_up': up, 'b_down': down}
+             for personality_id, (up, down) in personality_deltas.items()])
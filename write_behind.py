@@ -0,0 +1,293 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import select, update, insert, bindparam
+from sqlalchemy.exc import IntegrityError
+from models import Quote, Command, QuoteMessage, Stats
+from command_rollup import count_commands, add_usage
+from votes import apply_vote_counts
+from response_cache import VOTES
+import data_versions
+
+logger = logging.getLogger(__name__)
+
+MAX_FLUSH_ATTEMPTS = 5  # consecutive failed flushes before pending command and message rows are dropped
+RETRY_BASE_DELAY = 0.5  # seconds before the first retry of a failed flush, doubled per further failure
+RETRY_MAX_DELAY = 60.0
+
+
+class WriteBehindBuffer:
+    """Accumulates counter deltas and command rows in memory and writes them in batches"""
+
+    def __init__(self, session_factory, flush_interval, max_pending, on_flush=None, writer=None):
+        self.Session = session_factory
+        self.on_flush = on_flush  # called with the new VOTES data version (or None) after each batch is committed
+        self.writer = writer  # runs the flush transaction, e.g. on a database write queue
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._failures = 0  # consecutive failed flushes
+        self._retry_at = 0.0  # monotonic time before which the background thread does not flush again
+        self.dropped_commands = 0
+        self.dropped_messages = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._reset()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def _reset(self):
+        self._use_deltas = {}  # {quote_id: uses since last flush}
+        self._last_used = {}  # {quote_id: most recent use}
+        self._vote_deltas = {}  # {quote_id: [upvotes, downvotes]}
+        self._stats_deltas = {}  # {personality_id: [quotes_used, upvotes, downvotes]}
+        self._commands = []  # pending rows for the commands table
+        self._messages = []  # pending rows for the quote_messages table
+
+    def _pending(self):
+        return len(self._use_deltas) + len(self._vote_deltas) + len(self._commands) + len(self._messages)
+
+    def _add_stats(self, personality_id, used, upvotes, downvotes):
+        deltas = self._stats_deltas.setdefault(personality_id, [0, 0, 0])
+        deltas[0] += used
+        deltas[1] += upvotes
+        deltas[2] += downvotes
+
+    def _notify_if_full(self):
+        if self._pending() >= self.max_pending:
+            self._wake.set()
+
+    def add_usage(self, quote_id, personality_id):
+        """Queue one use of a quote"""
+        with self._lock:
+            self._use_deltas[quote_id] = self._use_deltas.get(quote_id, 0) + 1
+            self._last_used[quote_id] = datetime.utcnow()
+            self._add_stats(personality_id, 1, 0, 0)
+            self._notify_if_full()
+
+    def add_vote(self, quote_id, personality_id, upvotes, downvotes):
+        """Queue vote counter deltas for a quote and its personality"""
+        with self._lock:
+            deltas = self._vote_deltas.setdefault(quote_id, [0, 0])
+            deltas[0] += upvotes
+            deltas[1] += downvotes
+            self._add_stats(personality_id, 0, upvotes, downvotes)
+            self._notify_if_full()
+
+    def add_command(self, user_id, command, quote_id=None, personality_id=None):
+        """Queue a row for the commands table and its hourly usage rollup"""
+        with self._lock:
+            self._commands.append({
+                'user_id': user_id,
+                'command': command,
+                'quote_id': quote_id,
+                'personality_id': personality_id,
+                'timestamp': datetime.utcnow()
+            })
+            self._notify_if_full()
+
+    def add_message(self, message_id, quote_id):
+        """Queue a row linking a sent Discord message to the quote it shows"""
+        with self._lock:
+            self._messages.append({'message_id': message_id, 'quote_id': quote_id,
+                                   'created_at': datetime.utcnow()})
+            self._notify_if_full()
+
+    def forget_quotes(self, quote_ids):
+        """Drop pending deltas for deleted quotes and unlink their pending commands"""
+        quote_ids = set(quote_ids)
+        if not quote_ids:
+            return
+        with self._lock:
+            for quote_id in quote_ids:
+                self._use_deltas.pop(quote_id, None)
+                self._last_used.pop(quote_id, None)
+                self._vote_deltas.pop(quote_id, None)
+            for command in self._commands:
+                if command['quote_id'] in quote_ids:
+                    command['quote_id'] = None
+            self._messages = [message for message in self._messages if message['quote_id'] not in quote_ids]
+
+    def flush(self):
+        """Write everything queued so far in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                batch = (self._use_deltas, self._last_used, self._vote_deltas, self._stats_deltas, self._commands,
+                         self._messages)
+                self._reset()
+
+            use_deltas, last_used, vote_deltas, stats_deltas, commands, messages = batch
+            if not (use_deltas or vote_deltas or stats_deltas or commands or messages):
+                return
+
+            try:
+                try:
+                    votes_version = self._run_write(batch)
+                except IntegrityError:
+                    # Rows linked to quotes deleted by another process fail their foreign key on every
+                    # attempt; unlink or drop them and retry, or give up if there were none
+                    if not self._drop_orphans(batch):
+                        raise
+                    votes_version = self._run_write(batch)
+            except Exception as e:
+                self._failures += 1
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** min(self._failures - 1, 16))
+                self._retry_at = time.monotonic() + delay
+                if self._failures >= MAX_FLUSH_ATTEMPTS:
+                    # Counter deltas belong to votes and uses that are already committed or served, so
+                    # they are always kept; only the log rows are given up to bound memory in an outage
+                    batch = self._without_rows(batch)
+                logger.error(f"Error flushing write-behind buffer, keeping {self._describe(batch)} "
+                             f"for a retry in {delay:.1f}s: {e}")
+                self._restore(batch)
+                return
+            self._failures = 0
+            self._retry_at = 0.0
+
+            if self.on_flush:
+                try:
+                    self.on_flush(votes_version)
+                except Exception as e:
+                    logger.error(f"Error in write-behind flush callback: {e}")
+
+    def _run_write(self, batch):
+        if self.writer:
+            return self.writer.run(self._write, batch)
+        return self._write(batch)
+
+    def _drop_orphans(self, batch):
+        """Unlink commands from, and drop message rows for, quotes that no longer exist
+
+        Returns True if the batch referenced any missing quote.
+        """
+        _, _, _, _, commands, messages = batch
+        quote_ids = {row['quote_id'] for row in commands + messages if row['quote_id'] is not None}
+        if not quote_ids:
+            return False
+        session = self.Session()
+        try:
+            existing = set(session.execute(select(Quote.id).where(Quote.id.in_(quote_ids))).scalars())
+        finally:
+            session.close()
+        missing = quote_ids - existing
+        if not missing:
+            return False
+        for command in commands:
+            if command['quote_id'] in missing:
+                command['quote_id'] = None
+        messages[:] = [message for message in messages if message['quote_id'] not in missing]
+        logger.warning(f"Unlinked write-behind rows from {len(missing)} deleted quotes")
+        return True
+
+    def _write(self, batch):
+        """Apply one batch of deltas and command rows in a single transaction
+
+        Returns the new VOTES data version when the batch changed vote counters, else None.
+        """
+        use_deltas, last_used, vote_deltas, stats_deltas, commands, messages = batch
+        session = self.Session()
+        try:
+            connection = session.connection()
+            quotes = Quote.__table__
+            stats = Stats.__table__
+            if use_deltas:
+                connection.execute(
+                    update(quotes).where(quotes.c.id == bindparam('b_id')).values(
+                        use_count=quotes.c.use_count + bindparam('b_delta'),
+                        last_used=bindparam('b_last_used')),
+                    [{'b_id': quote_id, 'b_delta': delta, 'b_last_used': last_used[quote_id]}
+                     for quote_id, delta in use_deltas.items()])
+            quote_votes = {quote_id: deltas for quote_id, deltas in vote_deltas.items() if any(deltas)}
+            apply_vote_counts(connection, quote_votes, {})
+            votes_version = data_versions.bump(connection, VOTES) if quote_votes else None
+            if stats_deltas:
+                connection.execute(
+                    update(stats).where(stats.c.personality_id == bindparam('b_personality_id')).values(
+                        total_quotes_used=stats.c.total_quotes_used + bindparam('b_used'),
+                        total_upvotes=stats.c.total_upvotes + bindparam('b_up'),
+                        total_downvotes=stats.c.total_downvotes + bindparam('b_down'),
+                        updated_at=datetime.utcnow()),
+                    [{'b_personality_id': personality_id, 'b_used': used, 'b_up': up, 'b_down': down}
+                     for personality_id, (used, up, down) in stats_deltas.items()])
+            if commands:
+                connection.execute(insert(Command.__table__), [
+                    {key: value for key, value in command.items() if key != 'personality_id'}
+                    for command in commands])
+                add_usage(connection, count_commands(
+                    (command['timestamp'], command['command'], command['personality_id'])
+                    for command in commands))
+            if messages:
+                connection.execute(insert(QuoteMessage.__table__), messages)
+            session.commit()
+            return votes_version
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _without_rows(self, batch):
+        """The batch without its command and message rows, which are counted as dropped"""
+        use_deltas, last_used, vote_deltas, stats_deltas, commands, messages = batch
+        if commands or messages:
+            self.dropped_commands += len(commands)
+            self.dropped_messages += len(messages)
+            logger.error(f"Dropping {len(commands)} commands and {len(messages)} quote messages after "
+                         f"{self._failures} failed flushes")
+        return use_deltas, last_used, vote_deltas, stats_deltas, [], []
+
+    @staticmethod
+    def _describe(batch):
+        use_deltas, _, vote_deltas, _, commands, messages = batch
+        return (f"{len(use_deltas)} usage deltas, {len(vote_deltas)} vote deltas, {len(commands)} commands "
+                f"and {len(messages)} quote messages")
+
+    @contextmanager
+    def paused(self):
+        """Hold off flushes, so rows read from the database inside and pending() count each delta once"""
+        with self._flush_lock:
+            yield
+
+    def pending(self):
+        """Deltas not written yet: ({quote_id: (upvotes, downvotes)}, {quote_id: uses})"""
+        with self._lock:
+            return ({quote_id: tuple(deltas) for quote_id, deltas in self._vote_deltas.items()},
+                    dict(self._use_deltas))
+
+    def _restore(self, batch):
+        """Merge a failed batch back into the pending buffers"""
+        use_deltas, last_used, vote_deltas, stats_deltas, commands, messages = batch
+        with self._lock:
+            for quote_id, delta in use_deltas.items():
+                self._use_deltas[quote_id] = self._use_deltas.get(quote_id, 0) + delta
+                self._last_used.setdefault(quote_id, last_used[quote_id])
+            for quote_id, (up, down) in vote_deltas.items():
+                deltas = self._vote_deltas.setdefault(quote_id, [0, 0])
+                deltas[0] += up
+                deltas[1] += down
+            for personality_id, (used, up, down) in stats_deltas.items():
+                self._add_stats(personality_id, used, up, down)
+            self._commands[:0] = commands
+            self._messages[:0] = messages
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            # A full buffer sets _wake on every add, so a failing database is retried on a timer instead
+            delay = self._retry_at - time.monotonic()
+            if delay > 0 and self._stopped.wait(delay):
+                break
+            self.flush()
+
+    def close(self):
+        """Stop the background flusher and write out anything still pending"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()